@@ -4,32 +4,46 @@ import re
 CSI = "\033["
 RESET = "\033[0m"
 
+_ANSI_PATTERN = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+
+plain_mode=False
+def set_plain_mode():
+    # --plain: no ANSI at all, for piping into files/grep
+    global plain_mode
+    plain_mode=True
+
+def _out(msg):
+    print(strip_ansi(msg) if plain_mode else msg)
+
 def print_error(msg):
-    print(f"{CSI}1;31m[!!]{RESET} >> {msg}")
+    _out(f"{CSI}1;31m[!!]{RESET} >> {msg}")
 
 def print_warn(msg):
-    print(f"{CSI}1;93m[!]{RESET} >> {msg}")
+    _out(f"{CSI}1;93m[!]{RESET} >> {msg}")
 
 def print_success(msg):
-    print(f"{CSI}1;92m[ :D ]{RESET} >> {msg}")
+    _out(f"{CSI}1;92m[ :D ]{RESET} >> {msg}")
 
 def print_cat(msg):
-    print(f"{CSI}1;95m[(◔◡◔)]{RESET} >> {msg}")
+    _out(f"{CSI}1;95m[(◔◡◔)]{RESET} >> {msg}")
 
 def print_info(msg, blinking=False):
     if blinking:
-        print(f"{CSI}1;5m[#]{CSI}5m >> {msg}")
+        _out(f"{CSI}1;5m[#]{CSI}5m >> {msg}")
     else:
-        print(f"{CSI}1m[#]{RESET} >> {msg}")
+        _out(f"{CSI}1m[#]{RESET} >> {msg}")
 
 def status_dead():
-    return f"{CSI}1;31m\u25A0{RESET}"
+    return "[dead] " if plain_mode else f"{CSI}1;31m\u25A0{RESET}"
 
 def status_alive():
-    return f"{CSI}1;94m\u25A0{RESET}"
+    return "[alive]" if plain_mode else f"{CSI}1;94m\u25A0{RESET}"
 
 def status_host():
-    return f"{CSI}1;92m\u25A0{RESET}"
+    return "[host] " if plain_mode else f"{CSI}1;92m\u25A0{RESET}"
+
+def status_filtered():
+    return "[filt] " if plain_mode else f"{CSI}1;93m\u25A0{RESET}"
 
 
 
@@ -39,7 +53,10 @@ def pass_st_var():
     global st
     st=True
 
-def print_loading_bar(value, max_value, msg, width=130):
+_BAR_FILLED = f"{CSI}1;107m {RESET}"
+_BAR_EMPTY = f"{CSI}97;1m-{RESET}"
+
+def format_loading_bar(value, max_value, msg, width=130):
     if st:
         width=30
     if max_value <= 0:
@@ -51,10 +68,13 @@ def print_loading_bar(value, max_value, msg, width=130):
     progress = value / max_value
     filled = int(progress * width)
 
-    bar = f"{CSI}1;107m {RESET}" * filled + f"{CSI}97;1m-{RESET}" * (width - filled)
+    bar = _BAR_FILLED * filled + _BAR_EMPTY * (width - filled)
     percent = progress * 100
 
-    print(f"\r {bar} {percent:6.2f}% {msg}", end="", flush=True)
+    return f"\r {bar} {percent:6.2f}% {msg}"
+
+def print_loading_bar(value, max_value, msg, width=130):
+    print(format_loading_bar(value, max_value, msg, width), end="", flush=True)
 
 def truncate(text: str, width: int) -> str:
     if not st:
@@ -73,8 +93,7 @@ def truncate(text: str, width: int) -> str:
 
 
 def strip_ansi(text: str) -> str:
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    return ansi_escape.sub('', text)
+    return _ANSI_PATTERN.sub('', text)
 
 
 def visual_len(text: str) -> int:
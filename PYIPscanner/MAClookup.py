@@ -1,7 +1,15 @@
+from jsondbconverter import build_index, HEADER, INDEX_MAGIC, INDEX_VERSION
+from typing import Optional
 from CLIhelpers import *
+import threading
+import bisect
 import json
+import mmap
+import sys
+import os
 
 filepath = "mac_vendors.json"
+indexpath = "mac_vendors.idx"
 
 """
                                             VERY IMPORTANT!!!!!!!!
@@ -14,31 +22,117 @@ filepath = "mac_vendors.json"
     Even if the website doesn't provide a license, i will still include this message.
 """
 
-PLDB = None #PreLoadedDataBase ; funky solution
+class MACVendorIndex:
+    # mmap-ed reader for the binary index built by jsondbconverter.build_index().
+    # Nothing is parsed up front, lookups bisect straight over the mapped arrays.
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self._file.close()
+            raise
+        view = memoryview(self._mm)
+
+        magic, version, _, n_l, n_m, n_s, n_vendors, strings_len = HEADER.unpack_from(view)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError("unknown MAC index format")
+
+        offset = HEADER.size + (-HEADER.size % 8)
+
+        def section(count, fmt, size):
+            nonlocal offset
+            part = view[offset:offset + count * size].cast(fmt)
+            offset += count * size
+            offset += -offset % 8
+            return part
+
+        self.tables = []
+        for count, fmt, size, digits in ((n_l, 'I', 4, 6), (n_m, 'I', 4, 7), (n_s, 'Q', 8, 9)):
+            prefixes = section(count, fmt, size)
+            vendor_ids = section(count, 'I', 4)
+            self.tables.append((digits, prefixes, vendor_ids))
+        # same order as before: MA-S, then MA-M, then MA-L
+        self.tables.sort(key=lambda t: -t[0])
+        self.offsets = section(n_vendors + 1, 'I', 4)
+        self.strings = view[offset:offset + strings_len]
+
+    def lookup(self, macaddr: str) -> Optional[str]:
+        hex_digits = macaddr.replace(':', '').replace('-', '')
+        for digits, prefixes, vendor_ids in self.tables:
+            try:
+                key = int(hex_digits[:digits], 16)
+            except ValueError:
+                return None
+            i = bisect.bisect_left(prefixes, key)
+            if i < len(prefixes) and prefixes[i] == key:
+                vendor_id = vendor_ids[i]
+                return bytes(self.strings[self.offsets[vendor_id]:self.offsets[vendor_id + 1]]).decode('utf-8')
+        return None
+
+
+PLDB = None #PreLoadedDataBase ; funky solution (now an mmap-ed MACVendorIndex, dict only as a fallback)
+_load_lock = threading.Lock()
+
+def _index_is_fresh() -> bool:
+    if not os.path.exists(indexpath):
+        return False
+    if not os.path.exists(filepath):
+        return True
+    return os.path.getmtime(indexpath) >= os.path.getmtime(filepath)
+
+def _load_database(verbose: bool = False):
+    global PLDB
+    with _load_lock:
+        if PLDB is not None:
+            return PLDB
+
+        # the index stores little endian arrays and is read with native casts
+        if sys.byteorder == 'little':
+            try:
+                if not _index_is_fresh():
+                    if verbose:
+                        print_info("Building MAC address index (one time)...")
+                    build_index(filepath, indexpath)
+                PLDB = MACVendorIndex(indexpath)
+                return PLDB
+            except (OSError, ValueError) as e:
+                if verbose and not isinstance(e, FileNotFoundError):
+                    print_warn(f"MAC index unusable ({e}), falling back to JSON")
+
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                PLDB = json.load(f)
+        except FileNotFoundError:
+            if verbose:
+                print_error("Database file('mac_vendors.json') is not in the working directory.")
+        return PLDB
+
 def preload_database():
     print_info("Preloading MAC address database...")
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            global PLDB
-            PLDB = json.load(f)
+    if _load_database(verbose=True) is not None:
         print_success("Database loaded!")
-    except FileNotFoundError:
-        print_error("Database file('mac_vendors.json') is not in the working directory.")
 
 def _get_vendor_from_mac(macaddr):
+    db = PLDB if PLDB is not None else _load_database()
+
+    if isinstance(db, MACVendorIndex):
+        vendor = db.lookup(macaddr)
+        return vendor if vendor is not None else "[N/D]"
+
     prefix_MA_L = macaddr[:8]
     prefix_MA_M = macaddr[:10]
     prefix_MA_S = macaddr[:13]
 
-    if PLDB is not None:
+    if db is not None:
         try:
-            return PLDB[prefix_MA_S]
+            return db[prefix_MA_S]
         except KeyError:
             try:
-                return PLDB[prefix_MA_M]
+                return db[prefix_MA_M]
             except KeyError:
                 try:
-                    return PLDB[prefix_MA_L]
+                    return db[prefix_MA_L]
                 except KeyError:
                     return "[N/D]"
     return f"{RESET}{CSI}91m[err 2]{RESET}"
@@ -0,0 +1,339 @@
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+from netTools import *
+from netTools import _ping_command
+from contextlib import asynccontextmanager
+from collections import deque
+from probeBudget import BUDGET
+from dnsResolver import RESOLVER
+from rttEstimator import RTT
+from rateLimiter import RATE
+from stageTimer import PROFILER
+import scanCache
+import concurrent.futures
+import itertools
+import threading
+import asyncio
+import queue
+import time
+
+# One event loop drives host probes, port checks and enrichment for the whole scan,
+# instead of a thread per IP + another pool of threads per get_open_ports() call.
+# Blocking helpers (arp, custom fetch_funcs) still run on a small shared executor.
+
+_DONE = object()
+
+
+def _resolve(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+@asynccontextmanager
+async def budget_slot(ip: str, to_target: bool = True):
+    # Same scan-wide BUDGET as the threaded probes. When it's full we park on a future
+    # that the budget resolves (possibly from another thread) once our slot is granted.
+    # Pacing (--rate) happens before that, so nobody holds a slot while waiting for a token.
+    delay = RATE.reserve(ip if to_target else None)
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+    loop = asyncio.get_running_loop()
+    waiter = loop.create_future()
+    entry = BUDGET.acquire_or_queue(ip, 1, lambda: loop.call_soon_threadsafe(_resolve, waiter))
+    if entry is not None:
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if not BUDGET.cancel_queued(entry):
+                BUDGET.release(ip)
+            raise
+    try:
+        yield
+    finally:
+        BUDGET.release(ip)
+
+
+async def timed_stage(name: str, awaitable):
+    # PROFILER.stage() for awaitables, the time includes waiting on the loop
+    if not PROFILER.enabled:
+        return await awaitable
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        PROFILER.record(name, time.perf_counter() - start)
+
+
+async def async_run_ping(ip: str, timeout_sec: int = 1) -> Tuple[bool, Optional[str]]:
+    cmd, popen_kwargs = _ping_command(ip, timeout_sec)
+    async with budget_slot(ip):
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                **popen_kwargs
+            )
+        except OSError:
+            return False, None
+
+        try:
+            stdout, _ = await asyncio.wait_for(proc.communicate(), timeout_sec + 0.5)
+        except asyncio.TimeoutError:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+            return False, None
+
+    stdout = stdout.decode('utf-8', errors='ignore')
+    success = 'ttl=' in stdout.lower()
+    return success, stdout if success else None
+
+
+async def async_probe_host(ip: str, timeout_sec: int = 1) -> HostProbe:
+    cached = get_cached_probe(ip, timeout_sec)
+    if cached is not None:
+        return cached
+
+    if uses_icmp_sweeper():
+        # only for the odd host its chunk's sweep didn't cover (sweep failed, longer timeout...)
+        return await asyncio.get_running_loop().run_in_executor(None, probe_host, ip, timeout_sec)
+
+    success, stdout = await async_run_ping(ip, timeout_sec)
+    return store_probe(ip, parse_ping_output(success, stdout, timeout_sec))
+
+
+async def async_is_port_open(ip: str, port: int, timeout: float) -> Optional[bool]:
+    # None = timed out, so the caller can retry it
+    async with budget_slot(ip):
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        except asyncio.TimeoutError:
+            return None
+        except OSError:
+            return False
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True
+
+
+async def _first_open(ip: str, ports: List[int], timeout: float, states: dict):
+    # --first-hit: probes finish in any order, the first open one cancels the rest
+    tasks = {asyncio.ensure_future(async_is_port_open(ip, port, timeout)): port for port in ports}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                states[tasks[task]] = task.result()
+            if any(states[tasks[task]] for task in done):
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def _async_port_states(ip: str, ports: List[int], timeout: float, retries: int,
+                             stop_on_open: bool = False) -> dict:
+    # {port: True (open) / False (refused) / None (timed out, after every retry)}
+    states = {}
+    for _ in range(retries + 1):
+        if stop_on_open:
+            await _first_open(ip, ports, timeout, states)
+            if True in states.values():
+                break
+        else:
+            results = await asyncio.gather(*(async_is_port_open(ip, port, timeout) for port in ports))
+            states.update(zip(ports, results))
+        ports = [port for port in ports if states.get(port) is None]
+        if not ports:
+            break
+    return states
+
+
+async def async_scan_host_ports(ip: str, ports: List[int], timeout: float, retries: int = 0,
+                                rtt_ms: Optional[float] = None) -> Tuple[List[int], bool]:
+    # same sentinel-first strategy, learned order and --first-hit as netTools.scan_host_ports
+    if not ports:
+        return [], False
+    first_hit = PORT_STATS.first_hit
+    sentinels, rest = sentinel_split(PORT_STATS.order(ip, ports))
+    states = await _async_port_states(ip, sentinels, timeout, retries, first_hit) if sentinels else {}
+    if first_hit and True in states.values():
+        pass
+    elif sentinels and all(state is None for state in states.values()):
+        reduced = filtered_timeout(timeout, rtt_ms)
+        if reduced is None:
+            return [], True
+        states.update(await _async_port_states(ip, rest, reduced, 0, first_hit))
+    elif rest:
+        states.update(await _async_port_states(ip, rest, timeout, retries, first_hit))
+    open_ports = sorted(port for port, state in states.items() if state)
+    filtered = all(state is None for state in states.values())
+    if not filtered:
+        PORT_STATS.record(ip, states, open_ports)
+    return open_ports, filtered
+
+
+async def async_get_hostname(ip: str, timeout: float = 1.0) -> Optional[str]:
+    if RESOLVER.available:
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(RESOLVER.submit(ip)), timeout + 0.5)
+        except asyncio.TimeoutError:
+            return None
+
+    # getnameinfo() instead of get_hostname() so we never touch socket.setdefaulttimeout()
+    loop = asyncio.get_running_loop()
+    async with budget_slot(ip, to_target=False):
+        try:
+            hostname, _ = await asyncio.wait_for(loop.getnameinfo((ip, 0), socket.NI_NAMEREQD), timeout)
+            return hostname
+        except (OSError, asyncio.TimeoutError):
+            return None
+
+
+async def async_scan_ip(ip: str, field_manager, finalize: Callable, ports: List[int], ip_width: int,
+                        skip_ports: bool, port_timeout: Optional[float] = None):
+    loop = asyncio.get_running_loop()
+
+    probe = await timed_stage('probe', async_probe_host(ip))
+    alive = probe.alive
+
+    result_data = {
+        'ip': ip,
+        'status': 'dead'
+    }
+
+    cached = {}
+    if alive and scanCache.CACHE is not None:
+        cached, fresh_mac = await loop.run_in_executor(None, scanCache.load_facts, ip, get_mac_address)
+        result_data.update(cached)
+        if 'mac' not in cached:
+            result_data['mac'] = fresh_mac
+
+    active_fields = field_manager.get_active_fields(skip_ports)
+    pending = {}
+
+    for field in active_fields:
+        if field.key == "vendor" or field.key in result_data:
+            continue
+
+        if not alive and (field.requires_alive or field.key in ("open_ports", "os")):
+            result_data[field.key] = field.default_value
+            continue
+
+        if field.key == "open_ports":
+            if skip_ports:
+                result_data[field.key] = field.default_value
+            else:
+                timeout = port_timeout or RTT.port_timeout(ip, probe.rtt_ms)
+                pending[field.key] = timed_stage(field.key, async_scan_host_ports(ip, ports, timeout, RTT.retries, probe.rtt_ms))
+        elif field.key == "hostname":
+            pending[field.key] = timed_stage(field.key, async_get_hostname(ip))
+        elif field.key == "ping_ms":
+            # same echo that proved the host alive, no need to ping again
+            result_data[field.key] = probe.rtt_ms
+        elif field.key == "os":
+            result_data[field.key] = detect_os_from_ttl(probe.ttl) if probe.ttl else None
+        elif field.fetch_func:
+            pending[field.key] = loop.run_in_executor(None, field.fetch_func, ip, alive)
+        else:
+            result_data[field.key] = field.default_value
+
+    if pending:
+        values = await asyncio.gather(*pending.values(), return_exceptions=True)
+        for key, value in zip(pending.keys(), values):
+            result_data[key] = None if isinstance(value, BaseException) else value
+
+    for field in active_fields:
+        if field.key == "open_ports" and isinstance(result_data.get(field.key), tuple):
+            open_ports, filtered = result_data[field.key]
+            result_data[field.key] = ','.join(map(str, open_ports)) if open_ports else (FILTERED if filtered else None)
+        if field.key in result_data and result_data[field.key] is None:
+            result_data[field.key] = field.default_value
+
+    outcome = finalize(ip, alive, result_data, field_manager, ip_width, skip_ports)
+    scanCache.remember(ip, outcome[3], cached)
+    return outcome
+
+
+async def _async_scan_all(ip_list: Iterable[str], field_manager, finalize: Callable, ports: List[int],
+                          ip_width: int, skip_ports: bool, workers: int, out: queue.Queue, stop: threading.Event):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers=min(32, max(1, workers))))
+
+    # `workers` coroutines pull from one shared iterator, so only `workers` hosts exist at a
+    # time no matter how big the target list is, and results go out as they complete.
+    # With the in-process sweeper, targets are pulled a SWEEP_CHUNK at a time and the chunk is
+    # pinged in one sweep first (like stream_staged does for the threaded engine), so host
+    # probes come from the cache instead of a blocking sweep per host on the executor.
+    source = enumerate(ip_list)
+    batch_size = SWEEP_CHUNK if uses_icmp_sweeper() else 1
+    pulled: deque = deque()
+    pull_lock = asyncio.Lock()
+
+    async def pull():
+        async with pull_lock:
+            if not pulled:
+                batch = list(itertools.islice(source, batch_size))
+                if batch and batch_size > 1:
+                    await loop.run_in_executor(None, sweep_batch, [ip for _, ip in batch])
+                pulled.extend(batch)
+            return pulled.popleft() if pulled else None
+
+    async def worker():
+        while not stop.is_set():
+            item = await pull()
+            if item is None:
+                return
+            idx, ip = item
+            try:
+                outcome = await async_scan_ip(ip, field_manager, finalize, ports, ip_width, skip_ports)
+            except Exception as e:
+                outcome = e
+            out.put((idx, ip, outcome))
+
+    tasks = [asyncio.ensure_future(worker()) for _ in range(max(1, workers))]
+    # Ctrl-C on the consumer side: drop in-flight hosts now instead of letting their port scans run out
+    while tasks:
+        _, pending = await asyncio.wait(tasks, timeout=0.1)
+        tasks = list(pending)
+        if stop.is_set():
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            break
+
+
+def run_async_scan(ip_list: Iterable[str], field_manager, finalize: Callable, ports: List[int], ip_width: int,
+                   skip_ports: bool, workers: int = 200) -> Iterator[tuple]:
+    # The loop lives on its own thread so the caller can keep consuming results
+    # (progress bar etc.) the same way it does with the threaded engine.
+    # Yields (index, ip, result_or_exception) in completion order.
+    out: queue.Queue = queue.Queue()
+    stop = threading.Event()
+
+    def runner():
+        try:
+            asyncio.run(_async_scan_all(ip_list, field_manager, finalize, ports, ip_width,
+                                        skip_ports, workers, out, stop))
+        finally:
+            out.put(_DONE)
+
+    thread = threading.Thread(target=runner, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = out.get()
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,242 @@
+from typing import Callable, Dict, List, Optional
+from CLIhelpers import status_host
+import subprocess
+import statistics
+import threading
+import platform
+import argparse
+import tempfile
+import socket
+import json
+import time
+import sys
+import io
+import os
+
+# Reproducible numbers instead of the "IPs/sec" line: stand-in hosts on 127.0.0.0/8
+# with open (optionally slow to accept), closed and filtered ports, and timings for
+# the hot paths. Output is JSON so runs from different versions can be diffed.
+#
+#   python benchmark.py --output bench.json
+#   python benchmark.py --hosts 32 --accept-delay 0.05 --repeat 10
+
+
+class StandInHost:
+    """Listeners on one loopback IP.
+
+    open ports accept normally, or `accept_delay` late with a tiny backlog (a slow/overloaded service),
+    filtered ports have a full accept queue so new SYNs get dropped and connects time out,
+    closed ports have nothing listening (RST).
+    """
+
+    def __init__(self, ip: str, open_ports: List[int], filtered_ports: List[int], accept_delay: float = 0.0):
+        self.ip = ip
+        self.accept_delay = accept_delay
+        self._stop = threading.Event()
+        self._sockets: List[socket.socket] = []
+        self._fillers: List[socket.socket] = []
+
+        for port in open_ports:
+            srv = self._listen(port, 1 if accept_delay else 128)
+            threading.Thread(target=self._accept_loop, args=(srv,), daemon=True).start()
+
+        for port in filtered_ports:
+            srv = self._listen(port, 0)
+            # fill the accept queue and never accept, the kernel drops further SYNs
+            for _ in range(3):
+                filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                filler.setblocking(False)
+                filler.connect_ex((ip, port))
+                self._fillers.append(filler)
+
+    def _listen(self, port: int, backlog: int) -> socket.socket:
+        srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        srv.bind((self.ip, port))
+        srv.listen(backlog)
+        srv.settimeout(0.2)
+        self._sockets.append(srv)
+        return srv
+
+    def _accept_loop(self, srv: socket.socket):
+        while not self._stop.is_set():
+            if self.accept_delay:
+                time.sleep(self.accept_delay)
+            try:
+                conn, _ = srv.accept()
+            except (socket.timeout, OSError):
+                continue
+            conn.close()
+
+    def close(self):
+        self._stop.set()
+        for sock in self._fillers + self._sockets:
+            sock.close()
+
+
+def _timed(fn: Callable, repeat: int, warmup: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        'runs': repeat,
+        'median_s': round(statistics.median(samples), 6),
+        'min_s': round(min(samples), 6),
+        'max_s': round(max(samples), 6),
+        'mean_s': round(statistics.fmean(samples), 6),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def bench_open_ports(host: StandInHost, ports: List[int], repeat: int) -> dict:
+    from netTools import get_open_ports
+    result = _timed(lambda: get_open_ports(host.ip, ports, timeout=0.6, max_workers=100), repeat)
+    result['ports'] = len(ports)
+    result['open_found'] = len(get_open_ports(host.ip, ports, timeout=0.6, max_workers=100))
+    return result
+
+
+def bench_scan_ip(host: StandInHost, ports: List[int], repeat: int) -> dict:
+    import scanner
+    from netTools import clear_probe_cache
+    fm = scanner.FieldManager()
+
+    def run():
+        clear_probe_cache()  # every run probes from scratch
+        scanner.scan_ip_return(host.ip, fm, ports, 15, False)
+
+    return _timed(run, repeat)
+
+
+def bench_render(rows: int, repeat: int) -> dict:
+    import scanner
+    from renderer import Renderer
+    fm = scanner.FieldManager()
+    fields = fm.get_active_fields(False)
+    data = {'ip': '127.0.0.1', 'status': 'host', 'hostname': 'stand-in.local', 'open_ports': '22,80,443',
+            'ping_ms': 0.4, 'mac': '02:00:00:00:00:01', 'vendor': 'Stand-in Networks', 'os': 'Linux/Unix/MacOS',
+            'wol': 'http://localhost:2/02:00:00:00:00:01/'}
+
+    def run():
+        renderer = Renderer(rows, stream=io.StringIO())
+        for i in range(rows):
+            line, plain_length = scanner._build_output_line(f"127.0.{i // 256}.{i % 256}", 15, status_host(),
+                                                            data, fields, fm)
+            renderer.row(line, plain_length)
+            renderer.progress(i + 1, f"({i + 1}/{rows} scanned)")
+        renderer.close()
+
+    result = _timed(run, repeat)
+    result['rows'] = rows
+    result['rows_per_sec'] = round(rows / result['median_s'], 1)
+    return result
+
+
+def bench_csv(rows: int, repeat: int) -> dict:
+    import scanner
+    from fileHelpers import CSVSink
+    fieldnames = scanner.FieldManager().get_csv_fieldnames(False)
+    row = {name: '[N/D]' for name in fieldnames}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.csv')
+
+        def run():
+            sink = CSVSink(path, fieldnames)
+            for i in range(rows):
+                row['ip'] = f"127.0.{i // 256}.{i % 256}"
+                sink.write(row)
+            sink.close()
+
+        result = _timed(run, repeat)
+    result['rows'] = rows
+    result['rows_per_sec'] = round(rows / result['median_s'], 1)
+    return result
+
+
+def bench_main(cidr: str, ports: List[int], repeat: int, extra_args: List[str]) -> dict:
+    # separate process per run: fresh caches, and it's what a user actually runs
+    here = os.path.dirname(os.path.abspath(__file__))
+    cmd = [sys.executable, os.path.join(here, 'scanner.py'), '--range', cidr,
+           '--ports', ','.join(map(str, ports))] + extra_args
+
+    def run():
+        subprocess.run(cmd, cwd=here, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, timeout=600)
+
+    result = _timed(run, repeat, warmup=0)
+    result['args'] = cmd[2:]
+    total = 2 ** (32 - int(cidr.split('/')[1])) if '/' in cidr else 1
+    result['ips_per_sec'] = round(total / result['median_s'], 1)
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description="PYIPscanner benchmarks on loopback stand-in hosts")
+    ap.add_argument('--base', default='127.77', help='First two octets of the stand-in /16 (default: 127.77)')
+    ap.add_argument('--hosts', type=int, default=8, help='Stand-in hosts with listeners')
+    ap.add_argument('--open-ports', default='22,80,443,8080', help='Ports with a listener on every stand-in host')
+    ap.add_argument('--closed-ports', default='21,23,25,3306,5432', help='Ports with nothing listening')
+    ap.add_argument('--filtered-ports', default='9443,6379', help='Ports whose SYNs get dropped')
+    ap.add_argument('--accept-delay', type=float, default=0.0, help='Seconds the open listeners wait per accept()')
+    ap.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark')
+    ap.add_argument('--rows', type=int, default=5000, help='Rows for the render and CSV benchmarks')
+    ap.add_argument('--skip-main', action='store_true', help='Skip the full-subnet scanner.py run')
+    ap.add_argument('--main-args', default='', help='Extra scanner.py arguments for the full-subnet run')
+    ap.add_argument('--output', default=None, help='Write JSON here instead of stdout')
+    args = ap.parse_args()
+
+    parse = lambda value: [int(p) for p in value.split(',') if p.strip()]
+    open_ports, closed_ports, filtered_ports = parse(args.open_ports), parse(args.closed_ports), parse(args.filtered_ports)
+    all_ports = open_ports + closed_ports + filtered_ports
+
+    hosts = [StandInHost(f"{args.base}.0.{i + 1}", open_ports, filtered_ports, args.accept_delay)
+             for i in range(args.hosts)]
+    try:
+        results = {
+            'get_open_ports': bench_open_ports(hosts[0], all_ports, args.repeat),
+            'scan_ip_return': bench_scan_ip(hosts[0], all_ports, args.repeat),
+            'render': bench_render(args.rows, args.repeat),
+            'csv_export': bench_csv(args.rows, args.repeat),
+        }
+        if not args.skip_main:
+            results['main_subnet'] = bench_main(f"{args.base}.0.0/24", all_ports, max(1, args.repeat // 2),
+                                                args.main_args.split())
+    finally:
+        for host in hosts:
+            host.close()
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'hosts': args.hosts, 'open_ports': open_ports, 'closed_ports': closed_ports,
+            'filtered_ports': filtered_ports, 'accept_delay': args.accept_delay, 'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"Wrote {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from pipeline import stream_completed
+from neighborTable import NEIGHBORS
+from netTools import *
+import concurrent.futures
+import csv
+import os
+
+# --diff-against: a cheap liveness pass over every target, compared with an earlier CSV
+# export. Only hosts that are new, came back, or whose TTL (OS guess) / MAC changed get
+# the full enrichment; hosts that went away are reported, everything else is carried over.
+
+CHANGE_NEW = "new"
+CHANGE_BACK = "back"
+CHANGE_CHANGED = "changed"
+CHANGE_GONE = "gone"
+
+
+def load_snapshot(path: str) -> Optional[Dict[str, dict]]:
+    if not os.path.exists(path):
+        print_error(f"File not found: {path}")
+        return None
+    try:
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            return {row['ip']: row for row in csv.DictReader(f) if row.get('ip')}
+    except (OSError, csv.Error, KeyError) as e:
+        print_error(f"Failed to read snapshot {path}: {e}")
+        return None
+
+
+def _was_alive(row: Optional[dict]) -> bool:
+    return row is not None and row.get('status') in ('alive', 'host', 'filtered')
+
+
+def _known(value: Optional[str]) -> bool:
+    return bool(value) and value not in ('[N/D]', '[err]')
+
+
+class DiffPlan:
+    def __init__(self):
+        self.enrich = TargetSet()
+        self.changes: Dict[str, str] = {}
+        self.gone: List[str] = []
+        self.unchanged: List[str] = []
+        self.dead: List[str] = []    # down now and last time, only kept for the export
+
+    def counts(self) -> Dict[str, int]:
+        counts = {CHANGE_NEW: 0, CHANGE_BACK: 0, CHANGE_CHANGED: 0}
+        for reason in self.changes.values():
+            counts[reason.split(':')[0]] += 1
+        counts[CHANGE_GONE] = len(self.gone)
+        counts['unchanged'] = len(self.unchanged)
+        return counts
+
+
+def _probe_all(ip_list: Iterable[str], workers: int, window: int) -> Iterable[Tuple[str, HostProbe]]:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
+        for _, ip, outcome in stream_completed(ex, probe_host, ip_list, window):
+            if not isinstance(outcome, Exception):
+                yield ip, outcome
+
+
+def classify(ip: str, probe: HostProbe, previous: Optional[dict]) -> Optional[str]:
+    """Why `ip` needs a deep probe, or None if it looks the same as last time."""
+    if previous is None:
+        return CHANGE_NEW
+    if not _was_alive(previous):
+        return CHANGE_BACK
+
+    reasons = []
+    os_guess = detect_os_from_ttl(probe.ttl)
+    if _known(previous.get('os')) and previous['os'] != os_guess:
+        reasons.append("ttl")
+    if _known(previous.get('mac')):
+        mac = get_mac_address(ip)
+        if mac and mac != previous['mac']:
+            reasons.append("mac")
+    return f"{CHANGE_CHANGED}:{'+'.join(reasons)}" if reasons else None
+
+
+def plan_diff(ip_list: Iterable[str], previous: Dict[str, dict], workers: int, window: int) -> DiffPlan:
+    plan = DiffPlan()
+    alive_probes: List[Tuple[str, HostProbe]] = []
+    for ip, probe in _probe_all(ip_list, workers, window):
+        if probe.alive:
+            alive_probes.append((ip, probe))
+        elif _was_alive(previous.get(ip)):
+            plan.gone.append(ip)
+        else:
+            plan.dead.append(ip)
+
+    # every live host just answered, so their MACs are in the neighbor table now
+    NEIGHBORS.refresh(force=True)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
+        reasons = list(ex.map(lambda item: classify(item[0], item[1], previous.get(item[0])), alive_probes))
+
+    plan.gone.sort(key=ip_to_int)
+    plan.dead.sort(key=ip_to_int)
+    for (ip, _), reason in zip(alive_probes, reasons):
+        if reason is None:
+            plan.unchanged.append(ip)
+        else:
+            plan.changes[ip] = reason
+            plan.enrich.add_ip(ip)
+    return plan
@@ -0,0 +1,442 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from shardScan import BatchSender, split_blocks
+from netHelpers import TargetSet, ip_to_int, int_to_ip, is_valid_ip
+from CLIhelpers import print_info, print_warn, print_error, print_success, strip_ansi
+from dataclasses import dataclass, field
+from collections import deque
+import subprocess
+import threading
+import ipaddress
+import argparse
+import secrets
+import socket
+import queue
+import hmac
+import json
+import time
+import sys
+import re
+import os
+
+# Coordinator/worker mode for scanning from several machines. The coordinator cuts the
+# targets into /24 work units and leases them to workers over TCP; a worker scans its unit
+# with the normal engine and streams rows back. A unit whose worker disconnects or stops
+# renewing the lease goes back in the queue (only the IPs nobody reported yet), up to
+# MAX_ATTEMPTS times. The coordinator renders, counts and exports it all as one scan.
+#
+# Protocol, one JSON object per line:
+#   worker -> coordinator: hello {token, name}, lease, rows {unit, rows}, renew {unit}, done {unit, stats}
+#   coordinator -> worker: config {config}, unit {unit, targets, lease}, wait {seconds}, finished, error {message}
+
+DEFAULT_PORT = 7878
+TOKEN_ENV = "PYIPSCANNER_TOKEN"
+LEASE_SECONDS = 60.0
+RENEW_INTERVAL = 10.0
+MAX_ATTEMPTS = 3
+MAX_LINE = 16 * 1024 * 1024
+CONNECT_RETRIES = 10
+
+_CONTROL_CHARS = re.compile(r'[\x00-\x1f\x7f-\x9f]')
+
+
+def parse_address(value: str, default_host: str = '127.0.0.1') -> Optional[Tuple[str, int]]:
+    # "host:port", "host", "port" or ":port"
+    host, sep, port = value.strip().rpartition(':')
+    if not sep:
+        host, port = (default_host, value) if value.isdigit() else (value, str(DEFAULT_PORT))
+    try:
+        port = int(port)
+    except ValueError:
+        return None
+    if not 0 <= port <= 65535:
+        return None
+    return host or default_host, port
+
+
+def is_loopback(host: str) -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def clean_row(ip: str, result_data: dict) -> dict:
+    # a worker only gets to report data: no escape sequences or control characters in the
+    # values, and the row is about the IP it was filed under
+    row = {str(key): _CONTROL_CHARS.sub('', strip_ansi(value)) if isinstance(value, str) else value
+           for key, value in result_data.items()}
+    row['ip'] = ip
+    return row
+
+
+class _Channel:
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self._rfile = sock.makefile('rb')
+        self._lock = threading.Lock()
+
+    def send(self, kind: str, **fields):
+        data = json.dumps(dict(fields, type=kind), separators=(',', ':')).encode('utf-8') + b'\n'
+        with self._lock:
+            self.sock.sendall(data)
+
+    def recv(self) -> Optional[dict]:
+        line = self._rfile.readline(MAX_LINE)
+        if not line:
+            return None
+        if not line.endswith(b'\n'):
+            raise ValueError("message too long")
+        msg = json.loads(line)
+        if not isinstance(msg, dict):
+            raise ValueError("malformed message")
+        return msg
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._rfile.close()
+        self.sock.close()
+
+
+@dataclass
+class WorkUnit:
+    id: int
+    start: int
+    end: int
+    attempts: int = 0
+    owner: Optional[int] = None     # connection holding the lease
+    expires: float = 0.0
+    done: bool = False
+    reported: Set[int] = field(default_factory=set)
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start + 1
+
+    def remaining(self) -> List[List[int]]:
+        # [start, end] runs of IPs nobody has reported yet
+        runs: List[List[int]] = []
+        for n in range(self.start, self.end + 1):
+            if n in self.reported:
+                continue
+            if runs and runs[-1][1] == n - 1:
+                runs[-1][1] = n
+            else:
+                runs.append([n, n])
+        return runs
+
+
+class Coordinator:
+    """Hands out work units to --worker nodes and yields their rows as (idx, ip, outcome), like the engines."""
+
+    def __init__(self, targets: TargetSet, bind: Tuple[str, int], config: dict,
+                 render: Callable[[str, dict], tuple], token: Optional[str] = None, local_workers: int = 0):
+        self.targets = targets
+        self.render = render   # (ip, result_data) -> outcome, worker rows are never printed as sent
+        self.address = bind
+        self.config = config
+        self.local_workers = local_workers
+        self.token = token or os.environ.get(TOKEN_ENV) or (secrets.token_hex(16) if local_workers else None)
+        self.units = [WorkUnit(i, start, end) for i, (start, end) in enumerate(split_blocks(targets))]
+        self.stats: List[Any] = []    # whatever each finished unit's worker reported
+        self.errors: List[str] = []
+        self.workers: List[str] = []
+
+        self._lock = threading.Lock()
+        self._pending = deque(self.units)
+        self._leased: Dict[int, WorkUnit] = {}
+        self._open = len(self.units)   # units neither finished nor given up
+        self._events: queue.Queue = queue.Queue()
+        self._channels: Dict[int, _Channel] = {}
+        self._next_conn = 0
+        self._server: Optional[socket.socket] = None
+        self._procs: List[subprocess.Popen] = []
+        self._closed = False
+
+    def start(self):
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(self.address)
+        self._server.listen(64)
+        self.address = self._server.getsockname()[:2]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+        here = os.path.dirname(os.path.abspath(__file__))
+        host = '127.0.0.1' if self.address[0] in ('0.0.0.0', '') else self.address[0]
+        env = dict(os.environ, **{TOKEN_ENV: self.token})
+        for _ in range(self.local_workers):
+            self._procs.append(subprocess.Popen(
+                [sys.executable, os.path.join(here, 'scanner.py'), '--worker', f"{host}:{self.address[1]}"],
+                cwd=here, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                sock, addr = self._server.accept()
+            except OSError:
+                return
+            with self._lock:
+                conn_id = self._next_conn
+                self._next_conn += 1
+            threading.Thread(target=self._handle, args=(conn_id, sock, addr), daemon=True).start()
+
+    def _handle(self, conn_id: int, sock: socket.socket, addr):
+        channel = _Channel(sock)
+        try:
+            hello = channel.recv()
+            if not hello or hello.get('type') != 'hello' or \
+                    (self.token and not hmac.compare_digest(str(hello.get('token', '')), self.token)):
+                channel.send('error', message="bad hello or token")
+                return
+            with self._lock:
+                if self._closed:
+                    return
+                self._channels[conn_id] = channel
+                self.workers.append(f"{hello.get('name', '?')} ({addr[0]})")
+            channel.send('config', config=self.config)
+
+            while True:
+                msg = channel.recv()
+                if msg is None:
+                    break
+                kind = msg.get('type')
+                if kind == 'lease':
+                    lease = self._lease(conn_id)
+                    if lease is not None:
+                        channel.send('unit', unit=lease[0], targets=lease[1], lease=LEASE_SECONDS)
+                    elif self._open == 0:
+                        channel.send('finished')
+                        break
+                    else:
+                        channel.send('wait', seconds=1.0)
+                elif kind == 'rows':
+                    self._rows(conn_id, int(msg['unit']), msg['rows'])
+                elif kind == 'renew':
+                    self._renew(conn_id, int(msg['unit']))
+                elif kind == 'done':
+                    self._done(conn_id, int(msg['unit']), msg.get('stats'))
+        except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+            if not self._closed:
+                self._events.put(('error', f"worker {addr[0]}: {type(e).__name__}: {e}"))
+        finally:
+            self._release(conn_id)
+            with self._lock:
+                self._channels.pop(conn_id, None)
+            channel.close()
+
+    def _unit(self, unit_id: int) -> Optional[WorkUnit]:
+        return self.units[unit_id] if 0 <= unit_id < len(self.units) else None
+
+    def _lease(self, conn_id: int) -> Optional[Tuple[int, List[List[int]]]]:
+        with self._lock:
+            while self._pending:
+                unit = self._pending.popleft()
+                if unit.done:
+                    continue
+                unit.owner = conn_id
+                unit.attempts += 1
+                unit.expires = time.monotonic() + LEASE_SECONDS
+                self._leased[unit.id] = unit
+                return unit.id, unit.remaining()
+        return None
+
+    def _renew(self, conn_id: int, unit_id: int):
+        with self._lock:
+            unit = self._leased.get(unit_id)
+            if unit is not None and unit.owner == conn_id:
+                unit.expires = time.monotonic() + LEASE_SECONDS
+
+    def _rows(self, conn_id: int, unit_id: int, rows: list):
+        # rows from a worker that lost its lease still count, whoever reports an IP first wins
+        fresh = []
+        with self._lock:
+            unit = self._unit(unit_id)
+            if unit is None or unit.done:
+                return
+            if unit.owner == conn_id:
+                unit.expires = time.monotonic() + LEASE_SECONDS
+            for ip, result_data in rows:
+                if not is_valid_ip(ip) or not isinstance(result_data, dict):
+                    continue
+                n = ip_to_int(ip)
+                if not unit.start <= n <= unit.end or n in unit.reported:
+                    continue
+                unit.reported.add(n)
+                # workers only send data, the coordinator renders the line itself
+                fresh.append((ip, clean_row(ip, result_data)))
+        if fresh:
+            self._events.put(('rows', fresh))
+
+    def _done(self, conn_id: int, unit_id: int, stats: Any):
+        with self._lock:
+            unit = self._unit(unit_id)
+            if stats:
+                self.stats.append(stats)
+            if unit is None or unit.done:
+                return
+            if len(unit.reported) >= unit.size:
+                self._finish(unit)
+            elif unit.owner == conn_id:
+                self._retry(unit)
+
+    def _finish(self, unit: WorkUnit):
+        unit.done = True
+        unit.owner = None
+        unit.reported = set()
+        self._leased.pop(unit.id, None)
+        self._open -= 1
+
+    def _retry(self, unit: WorkUnit):
+        # caller holds the lock
+        unit.owner = None
+        self._leased.pop(unit.id, None)
+        if unit.attempts < MAX_ATTEMPTS:
+            self._pending.append(unit)
+            return
+        lost = [int_to_ip(n) for n in range(unit.start, unit.end + 1) if n not in unit.reported]
+        self._events.put(('failed', lost))
+        self._events.put(('error', f"gave up on {int_to_ip(unit.start)}-{int_to_ip(unit.end)} "
+                                   f"after {unit.attempts} attempts"))
+        self._finish(unit)
+
+    def _release(self, conn_id: int):
+        with self._lock:
+            for unit in [u for u in self._leased.values() if u.owner == conn_id]:
+                self._retry(unit)
+
+    def _expire(self):
+        now = time.monotonic()
+        with self._lock:
+            for unit in [u for u in self._leased.values() if u.expires < now]:
+                self._retry(unit)
+
+    def __iter__(self) -> Iterator[Tuple[int, str, Any]]:
+        try:
+            while True:
+                try:
+                    kind, payload = self._events.get(timeout=0.5)
+                except queue.Empty:
+                    self._expire()
+                    if self._open == 0 and self._events.empty():
+                        break
+                    continue
+                if kind == 'rows':
+                    for ip, result_data in payload:
+                        yield self.targets.index(ip), ip, self.render(ip, result_data)
+                elif kind == 'failed':
+                    for ip in payload:
+                        yield self.targets.index(ip), ip, ConnectionError("no worker finished this IP")
+                elif kind == 'error':
+                    self.errors.append(payload)
+                if self._open == 0 and self._events.empty():
+                    break
+        finally:
+            self.close()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            channels = list(self._channels.values())
+        if self._server is not None:
+            self._server.close()
+        # idle workers get 'finished' on their next lease request, the rest see the connection close
+        deadline = time.monotonic() + (2.0 if self._open == 0 else 0.0)
+        while self._channels and time.monotonic() < deadline:
+            time.sleep(0.05)
+        for channel in channels:
+            channel.close()
+        for proc in self._procs:
+            try:
+                proc.wait(max(0.1, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                proc.terminate()
+
+
+def _connect(address: Tuple[str, int], retries: int) -> socket.socket:
+    for attempt in range(retries + 1):
+        try:
+            return socket.create_connection(address, timeout=10)
+        except OSError:
+            if attempt == retries:
+                raise
+            time.sleep(min(5.0, 0.5 * 2 ** attempt))
+
+
+def run_worker(address: Tuple[str, int], scan_unit: Callable[[TargetSet, dict, Callable], Any],
+               token: Optional[str] = None, name: Optional[str] = None) -> bool:
+    """Worker side of --coordinator: leases units and runs `scan_unit(targets, config, send)` on each."""
+    try:
+        sock = _connect(address, CONNECT_RETRIES)
+    except OSError as e:
+        print_error(f"Could not reach coordinator {address[0]}:{address[1]}: {e}")
+        return False
+    sock.settimeout(None)
+    channel = _Channel(sock)
+    units = 0
+    try:
+        channel.send('hello', token=token or os.environ.get(TOKEN_ENV, ''), name=name or socket.gethostname())
+        msg = channel.recv()
+        if not msg or msg.get('type') != 'config':
+            print_error(f"Coordinator refused us: {msg.get('message') if msg else 'connection closed'}")
+            return False
+        config = dict(msg['config'])
+        config['args'] = argparse.Namespace(**config['args'])
+        print_info(f"Connected to coordinator {address[0]}:{address[1]}", False)
+
+        while True:
+            channel.send('lease')
+            msg = channel.recv()
+            if msg is None or msg.get('type') == 'finished':
+                break
+            if msg.get('type') == 'wait':
+                time.sleep(float(msg.get('seconds', 1.0)))
+                continue
+            if msg.get('type') != 'unit':
+                break
+
+            unit = msg['unit']
+            shard = TargetSet()
+            for start, end in msg['targets']:
+                shard.add_interval(start, end)
+
+            def post(kind, payload, unit=unit):
+                if kind == 'rows':
+                    channel.send('rows', unit=unit, rows=payload)
+                else:
+                    channel.send(kind, unit=unit, stats=payload)
+
+            stop = threading.Event()
+
+            def heartbeat(unit=unit):
+                while not stop.wait(RENEW_INTERVAL):
+                    channel.send('renew', unit=unit)
+
+            threading.Thread(target=heartbeat, daemon=True).start()
+            sender = BatchSender(post)
+            try:
+                stats = scan_unit(shard, config, sender.send)
+            finally:
+                stop.set()
+            sender.close('done', stats)
+            units += 1
+    except (OSError, ValueError) as e:
+        print_warn(f"Lost the coordinator: {e}")
+        return False
+    finally:
+        channel.close()
+    print_success(f"Scanned {units} work unit(s)")
+    return True
+
+
+if __name__ == "__main__": # Testing
+    for value in ("7878", "10.0.0.5", "10.0.0.5:9000", ":9000", "host:x"):
+        print(value, parse_address(value))
+    t = TargetSet()
+    t.add_spec("10.0.0.200-10.0.2.10")
+    print([(u.id, int_to_ip(u.start), int_to_ip(u.end)) for u in Coordinator(t, ('127.0.0.1', 0), {}, None).units])
@@ -0,0 +1,359 @@
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from probeBudget import BUDGET
+from rateLimiter import RATE
+import concurrent.futures
+import collections
+import threading
+import selectors
+import platform
+import random
+import socket
+import struct
+import time
+
+# Reverse-DNS (PTR) resolver. One UDP socket and one I/O thread serve every caller:
+# queries are pipelined to the system nameservers (/etc/resolv.conf), replies are
+# matched by query id, and answers land in a positive/negative TTL cache.
+# /etc/hosts is checked first, like the libc resolver does.
+#
+# This replaces socket.gethostbyaddr() + socket.setdefaulttimeout(), which blocked a
+# worker thread per lookup and raced with the timeouts of the port scan sockets.
+
+RESOLV_CONF = "/etc/resolv.conf"
+HOSTS_FILE = "/etc/hosts"
+
+DNS_PORT = 53
+TYPE_PTR = 12
+TYPE_SOA = 6
+CLASS_IN = 1
+RCODE_NXDOMAIN = 3
+
+MIN_TTL = 30
+MAX_TTL = 86400
+NEGATIVE_TTL = 300      # used when NXDOMAIN comes without an SOA
+FAILURE_TTL = 30        # timeouts/SERVFAIL, retried sooner
+
+SYSTEM = platform.system().lower()
+
+Nameserver = Union[str, Tuple[str, int]]
+
+
+def read_nameservers(path: str = RESOLV_CONF) -> List[Tuple[str, int]]:
+    servers = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == 'nameserver' and ':' not in parts[1]:
+                    servers.append((parts[1], DNS_PORT))
+    except OSError:
+        pass
+    return servers
+
+
+def read_hosts(path: str = HOSTS_FILE) -> Dict[str, str]:
+    hosts = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.split('#', 1)[0].split()
+                if len(parts) >= 2 and parts[0].count('.') == 3:
+                    hosts.setdefault(parts[0], parts[1])
+    except OSError:
+        pass
+    return hosts
+
+
+def reverse_name(ip: str) -> str:
+    return '.'.join(reversed(ip.split('.'))) + '.in-addr.arpa'
+
+
+def build_query(query_id: int, name: str, qtype: int = TYPE_PTR) -> bytes:
+    header = struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0)  # RD set
+    qname = b''.join(bytes([len(label)]) + label.encode('ascii') for label in name.split('.')) + b'\x00'
+    return header + qname + struct.pack('!HH', qtype, CLASS_IN)
+
+
+def _read_name(data: bytes, offset: int) -> Tuple[str, int]:
+    labels = []
+    end = None
+    for _ in range(128):  # guards against compression loops
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            continue
+        if length == 0:
+            offset += 1
+            break
+        labels.append(data[offset + 1:offset + 1 + length].decode('ascii', errors='replace'))
+        offset += 1 + length
+    return '.'.join(labels), end if end is not None else offset
+
+
+def parse_response(data: bytes) -> Tuple[int, int, str, Optional[str], Optional[int]]:
+    """Returns (query id, rcode, question name, ptr name or None, ttl or None)."""
+    query_id, flags, qdcount, ancount, nscount, _ = struct.unpack('!HHHHHH', data[:12])
+    rcode = flags & 0x0F
+    offset = 12
+    qname = ''
+    for _ in range(qdcount):
+        qname, offset = _read_name(data, offset)
+        offset += 4
+
+    ptr, ttl = None, None
+    for section_count, wanted in ((ancount, TYPE_PTR), (nscount, TYPE_SOA)):
+        for _ in range(section_count):
+            _, offset = _read_name(data, offset)
+            rtype, _, rttl, rdlength = struct.unpack('!HHIH', data[offset:offset + 10])
+            offset += 10
+            if rtype == wanted and ptr is None:
+                if rtype == TYPE_PTR:
+                    ptr, _ = _read_name(data, offset)
+                    ttl = rttl
+                elif ttl is None:
+                    ttl = rttl  # negative caching ttl from the SOA
+            offset += rdlength
+    return query_id, rcode, qname.lower(), ptr, ttl
+
+
+class _Query:
+    __slots__ = ('ip', 'name', 'futures', 'attempt', 'deadline', 'query_id')
+
+    def __init__(self, ip: str):
+        self.ip = ip
+        self.name = reverse_name(ip)
+        self.futures: List[concurrent.futures.Future] = []
+        self.attempt = 0
+        self.deadline = 0.0
+        self.query_id = 0
+
+
+class PTRResolver:
+    def __init__(self, nameservers: Optional[Iterable[Nameserver]] = None, timeout: float = 1.0,
+                 attempts: int = 2, max_in_flight: int = 256, hosts: Optional[Dict[str, str]] = None,
+                 budget=None, limiter=None):
+        servers = read_nameservers() if nameservers is None else list(nameservers)
+        self.nameservers = [(s, DNS_PORT) if isinstance(s, str) else tuple(s) for s in servers]
+        self.hosts = read_hosts() if hosts is None else hosts
+        self.timeout = timeout
+        self.attempts = max(1, attempts)
+        self.max_in_flight = max(1, max_in_flight)
+        self.budget = budget
+        self.limiter = limiter
+
+        self._cache: Dict[str, Tuple[Optional[str], float]] = {}
+        self._lock = threading.Lock()
+        self._queued: collections.deque = collections.deque()
+        self._waiting: Dict[str, _Query] = {}   # ip -> query, so duplicate lookups share one packet
+        self._in_flight: Dict[int, _Query] = {}
+        self._thread = None
+        self._sock = None
+        self._wake_r, self._wake_w = None, None
+
+    @property
+    def available(self) -> bool:
+        return bool(self.nameservers)
+
+    # cache ------------------------------------------------------------------------------
+
+    def cached(self, ip: str) -> Tuple[bool, Optional[str]]:
+        if ip in self.hosts:
+            return True, self.hosts[ip]
+        with self._lock:
+            entry = self._cache.get(ip)
+        if entry is None or entry[1] < time.monotonic():
+            return False, None
+        return True, entry[0]
+
+    def _store(self, ip: str, name: Optional[str], ttl: float):
+        with self._lock:
+            self._cache[ip] = (name, time.monotonic() + ttl)
+
+    # public api -------------------------------------------------------------------------
+
+    def submit(self, ip: str) -> concurrent.futures.Future:
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        hit, name = self.cached(ip)
+        if hit or not self.available:
+            future.set_result(name)
+            return future
+
+        self._start()
+        with self._lock:
+            query = self._waiting.get(ip)
+            if query is None:
+                query = self._waiting[ip] = _Query(ip)
+                self._queued.append(query)
+            query.futures.append(future)
+        self._wake()
+        return future
+
+    def resolve(self, ip: str, timeout: Optional[float] = None) -> Optional[str]:
+        try:
+            return self.submit(ip).result(timeout=timeout if timeout is not None else self.timeout + 1)
+        except concurrent.futures.TimeoutError:
+            return None
+
+    def resolve_many(self, ips: Iterable[str]) -> Dict[str, Optional[str]]:
+        futures = {ip: self.submit(ip) for ip in ips}
+        return {ip: future.result() for ip, future in futures.items()}
+
+    # I/O thread -------------------------------------------------------------------------
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.setblocking(False)
+            self._wake_r, self._wake_w = socket.socketpair()
+            self._wake_r.setblocking(False)
+            self._thread = threading.Thread(target=self._loop, name="ptr-resolver", daemon=True)
+            self._thread.start()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\x00')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _new_id(self) -> int:
+        while True:
+            query_id = random.getrandbits(16)
+            if query_id not in self._in_flight:
+                return query_id
+
+    def _send(self, query: _Query):
+        query.query_id = self._new_id()
+        server = self.nameservers[query.attempt % len(self.nameservers)]
+        # whole timeout is split over all attempts, so a lookup never takes longer than `timeout`
+        query.deadline = time.monotonic() + self.timeout / self.attempts
+        self._in_flight[query.query_id] = query
+        try:
+            self._sock.sendto(build_query(query.query_id, query.name), server)
+        except OSError:
+            query.deadline = 0.0  # fails over on the next timer pass
+
+    def _finish(self, query: _Query, name: Optional[str], ttl: float):
+        self._in_flight.pop(query.query_id, None)
+        if self.budget is not None:
+            self.budget.release(query.ip)
+        self._store(query.ip, name, ttl)
+        with self._lock:
+            self._waiting.pop(query.ip, None)
+            futures, query.futures = query.futures, []
+        for future in futures:
+            if not future.done():
+                future.set_result(name)
+
+    def _loop(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._sock, selectors.EVENT_READ, 'dns')
+        selector.register(self._wake_r, selectors.EVENT_READ, 'wake')
+        send_at = None  # head of the queue already holds a limiter token and may go out at this time
+
+        while True:
+            # start queued lookups while there's room (ours and the scan-wide budget's) and the
+            # rate limiter lets us; retries of queries already in flight aren't paced
+            blocked = False
+            while len(self._in_flight) < self.max_in_flight:
+                with self._lock:
+                    if not self._queued:
+                        break
+                    query = self._queued[0]
+                    if self.limiter is not None:
+                        if send_at is None:
+                            send_at = time.monotonic() + self.limiter.reserve()
+                        if send_at > time.monotonic():
+                            blocked = True
+                            break
+                    if self.budget is not None and not self.budget.try_acquire(query.ip):
+                        blocked = True
+                        break
+                    self._queued.popleft()
+                    send_at = None
+                self._send(query)
+
+            if self._in_flight:
+                wait = max(0.0, min(q.deadline for q in self._in_flight.values()) - time.monotonic())
+            else:
+                wait = None
+            if blocked:
+                wait = 0.01 if wait is None else min(wait, 0.01)
+                if send_at is not None and send_at > time.monotonic():
+                    wait = min(wait, send_at - time.monotonic())
+
+            for key, _ in selector.select(wait):
+                if key.data == 'wake':
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                while True:
+                    try:
+                        data, addr = self._sock.recvfrom(4096)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except OSError:
+                        break
+                    self._handle_reply(data, addr)
+
+            now = time.monotonic()
+            for query in [q for q in self._in_flight.values() if q.deadline <= now]:
+                del self._in_flight[query.query_id]
+                query.attempt += 1
+                if query.attempt < self.attempts:
+                    self._send(query)  # next attempt goes to the next nameserver
+                else:
+                    self._finish(query, None, FAILURE_TTL)
+
+    def _handle_reply(self, data: bytes, addr):
+        if len(data) < 12:
+            return
+        try:
+            query_id, rcode, qname, ptr, ttl = parse_response(data)
+        except (struct.error, IndexError):
+            return
+        query = self._in_flight.get(query_id)
+        if query is None or qname != query.name.lower():
+            return  # late reply to a retried query or spoofed/garbage packet
+        if (addr[0], addr[1]) not in self.nameservers:
+            return
+
+        if ptr:
+            self._finish(query, ptr, min(MAX_TTL, max(MIN_TTL, ttl or MIN_TTL)))
+        elif rcode == RCODE_NXDOMAIN or rcode == 0:
+            self._finish(query, None, min(NEGATIVE_TTL, ttl) if ttl else NEGATIVE_TTL)
+        else:
+            self._finish(query, None, FAILURE_TTL)  # SERVFAIL/REFUSED
+
+
+RESOLVER = PTRResolver(nameservers=[] if SYSTEM == 'windows' else None, budget=BUDGET, limiter=RATE)
+
+
+if __name__ == "__main__": # Testing against a stand-in DNS server on loopback
+    def stand_in_server(sock):
+        while True:
+            data, addr = sock.recvfrom(512)
+            query_id = struct.unpack('!H', data[:2])[0]
+            qname, end = _read_name(data, 12)
+            question = data[12:end + 4]
+            if qname.startswith('1.0.0.127'):
+                answer = b'\xc0\x0c' + struct.pack('!HHIH', TYPE_PTR, CLASS_IN, 600, 16) + b'\x09stand-in0\x05local\x00'
+                sock.sendto(struct.pack('!HHHHHH', query_id, 0x8180, 1, 1, 0, 0) + question + answer, addr)
+            else:
+                sock.sendto(struct.pack('!HHHHHH', query_id, 0x8183, 1, 0, 0, 0) + question, addr)
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    threading.Thread(target=stand_in_server, args=(server,), daemon=True).start()
+
+    resolver = PTRResolver(nameservers=[server.getsockname()], hosts={})
+    start = time.perf_counter()
+    answers = resolver.resolve_many([f"127.0.0.{i}" for i in range(1, 255)])
+    print(f"{sum(1 for a in answers.values() if a)} PTR / {len(answers)} lookups in {time.perf_counter() - start:.3f}s")
+    print(answers["127.0.0.1"], answers["127.0.0.2"])  # stand-in0.local None
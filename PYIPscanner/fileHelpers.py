@@ -1,7 +1,15 @@
+from typing import List, TextIO
+from abc import ABC, abstractmethod
 from netTools import *
+import time
+import gzip
+import json
+import csv
+import io
 import os
 
 #Why is only one function here :sob:
+#(not anymore)
 
 def load_ips_from_file(path: str) -> List[str]:
     if not os.path.exists(path):
@@ -21,4 +29,88 @@ def load_ips_from_file(path: str) -> List[str]:
                 out.extend(parse_ip_list(line))
             else:
                 out.append(line)
-    return out
\ No newline at end of file
+    return out
+
+
+def load_targets_from_file(path: str) -> TargetSet:
+    targets = TargetSet()
+    if not os.path.exists(path):
+        print_error(f"File not found: {path}")
+        return targets
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if not targets.add_spec(line):
+                print_warn(f"Skipping invalid entry in {path}: {line}")
+    return targets
+
+
+EXPORT_BUFFER = 1 << 16   # bytes, rows go out in big writes instead of one syscall each
+
+
+def open_export(path: str, compress: bool = False) -> TextIO:
+    # gzip when asked to or when the name says so; gzip's flush() ends a deflate block,
+    # so whatever was flushed can already be read with zcat while the scan runs
+    if compress or path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.GzipFile(path, 'wb', compresslevel=6), encoding='utf-8', newline='')
+    return open(path, 'w', newline='', encoding='utf-8', buffering=EXPORT_BUFFER)
+
+
+class _ExportSink(ABC):
+    # Writes each host's record as soon as it's done instead of keeping every result until the end.
+    # Buffered: flushed every `flush_interval` seconds so `tail -f` keeps up, fsynced every
+    # `fsync_interval` so a crash loses at most a few seconds of rows.
+    def __init__(self, path: str, fieldnames: List[str], flush_interval: float = 1.0,
+                 fsync_interval: float = 5.0, compress: bool = False):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.count = 0
+        self._file = open_export(path, compress)
+        self._last_flush = self._last_sync = time.monotonic()
+
+    def write(self, result: dict):
+        self._write(result)
+        self.count += 1
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._flush(now)
+
+    @abstractmethod
+    def _write(self, result: dict):
+        ...
+
+    def _flush(self, now: float, sync: bool = False):
+        self._file.flush()
+        self._last_flush = now
+        if sync or now - self._last_sync >= self.fsync_interval:
+            try:
+                os.fsync(self._file.fileno())
+            except (OSError, ValueError):
+                pass   # pipes, /dev/stdout...
+            self._last_sync = now
+
+    def close(self):
+        if not self._file.closed:
+            self._flush(time.monotonic(), sync=True)
+            self._file.close()
+
+
+class CSVSink(_ExportSink):
+    def __init__(self, path: str, fieldnames: List[str], **kwargs):
+        super().__init__(path, fieldnames, **kwargs)
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def _write(self, result: dict):
+        self._writer.writerow(result)
+
+
+class NDJSONSink(_ExportSink):
+    # one JSON object per line, same columns as the CSV
+    def _write(self, result: dict):
+        record = {key: result.get(key) for key in self.fieldnames}
+        self._file.write(json.dumps(record, separators=(',', ':'), default=str) + '\n')
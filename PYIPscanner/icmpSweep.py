@@ -0,0 +1,236 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import itertools
+import platform
+import struct
+import select
+import socket
+import errno
+import time
+import os
+
+# In-process ICMP echo sweeper. One socket sends echo requests for a whole batch of
+# targets and matches the replies by identifier + sequence, so host discovery doesn't
+# need a fork/exec of the system ping per IP.
+#
+# Linux unprivileged "ping sockets" (SOCK_DGRAM + IPPROTO_ICMP, allowed by
+# net.ipv4.ping_group_range) are tried first, raw sockets second (root / CAP_NET_RAW).
+# If neither can be opened, available() is False and callers fall back to _run_ping().
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+IP_RECVTTL = getattr(socket, 'IP_RECVTTL', 12)  # not exported by python, 12 on linux
+
+SYSTEM = platform.system().lower()
+
+_ids = itertools.count(os.getpid())
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _build_echo(ident: int, seq: int, payload: bytes = b'PYIPscanner') -> bytes:
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    checksum = _checksum(header + payload)
+    return struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum, ident, seq) + payload
+
+
+def _open_socket() -> Tuple[Optional[socket.socket], Optional[str]]:
+    if SYSTEM != 'linux':
+        # ping sockets and raw-socket reply semantics below are linux-specific
+        return None, None
+
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        try:
+            sock.setsockopt(socket.IPPROTO_IP, IP_RECVTTL, 1)
+        except OSError:
+            pass
+        return sock, 'dgram'
+    except OSError:
+        pass
+
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), 'raw'
+    except OSError:
+        return None, None
+
+
+_available = None
+def available() -> bool:
+    global _available
+    if _available is None:
+        sock, _ = _open_socket()
+        _available = sock is not None
+        if sock is not None:
+            sock.close()
+    return _available
+
+
+class ICMPSweeper:
+    def __init__(self):
+        self.sock, self.mode = _open_socket()
+        if self.sock is None:
+            raise OSError("No ICMP socket available (need ping_group_range or CAP_NET_RAW)")
+        self.sock.setblocking(False)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        except OSError:
+            pass
+        # the kernel rewrites the identifier on ping sockets, raw sockets keep ours
+        self.ident = next(_ids) & 0xFFFF
+        if self.mode == 'dgram':
+            self.sock.bind(('0.0.0.0', 0))
+            self.ident = self.sock.getsockname()[1] & 0xFFFF
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read_reply(self) -> Optional[Tuple[str, int, int, Optional[int]]]:
+        if self.mode == 'dgram':
+            data, ancdata, _, addr = self.sock.recvmsg(2048, socket.CMSG_SPACE(4))
+            ttl = None
+            for level, ctype, cdata in ancdata:
+                if level == socket.IPPROTO_IP and ctype == socket.IP_TTL and len(cdata) >= 4:
+                    ttl = struct.unpack('i', cdata[:4])[0]
+            icmp = data
+        else:
+            data, addr = self.sock.recvfrom(2048)
+            ihl = (data[0] & 0x0F) * 4
+            ttl = data[8]
+            icmp = data[ihl:]
+
+        if len(icmp) < 8:
+            return None
+        icmp_type, _, _, ident, seq = struct.unpack('!BBHHH', icmp[:8])
+        if icmp_type != ICMP_ECHO_REPLY:
+            return None
+        return addr[0], ident, seq, ttl
+
+    def sweep(self, ips: Iterable[str], timeout: float = 1.0, retries: int = 0,
+              max_in_flight: int = 4096, budget=None, limiter=None) -> Dict[str, Tuple[Optional[float], Optional[int]]]:
+        """Returns {ip: (rtt_ms, ttl)} for every host that answered.
+
+        With a budget every echo in flight holds one of its slots (per-host / per-/24 caps apply too).
+        With a limiter (rateLimiter.RateLimiter) echoes go out no faster than its rate, replies
+        keep being read while we wait.
+        """
+        to_send: List[Tuple[str, int]] = [(ip, 0) for ip in ips]
+        to_send.reverse()
+        pending: Dict[Tuple[str, int], Tuple[float, int]] = {}
+        results: Dict[str, Tuple[Optional[float], Optional[int]]] = {}
+        seq = 0
+        send_at = None  # next echo already holds a limiter token and may go out at this time
+
+        try:
+            while to_send or pending:
+                now = time.perf_counter()
+
+                while to_send and len(pending) < max_in_flight:
+                    ip, attempt = to_send[-1]
+                    if limiter is not None:
+                        if send_at is None:
+                            send_at = now + limiter.reserve(ip)
+                        if send_at > now:
+                            break
+                    if budget is not None and not budget.try_acquire(ip):
+                        if pending:
+                            break
+                        budget.acquire(ip)
+                    seq = (seq + 1) & 0xFFFF
+                    try:
+                        self.sock.sendto(_build_echo(self.ident, seq), (ip, 0))
+                    except (BlockingIOError, InterruptedError):
+                        if budget is not None:
+                            budget.release(ip)
+                        break  # socket buffer full, drain some replies first
+                    except OSError as e:
+                        if budget is not None:
+                            budget.release(ip)
+                        if e.errno == errno.ENOBUFS:
+                            break
+                        to_send.pop()  # unreachable/invalid target, counts as dead
+                        send_at = None
+                        continue
+                    to_send.pop()
+                    send_at = None
+                    pending[(ip, seq)] = (time.perf_counter(), attempt)
+
+                can_send = bool(to_send) and len(pending) < max_in_flight
+                paced = can_send and send_at is not None and send_at > now
+                # pending is insertion (= send time) ordered, so the oldest probe is always first
+                if paced:
+                    wait = min(0.05, send_at - now)
+                else:
+                    wait = 0.0 if can_send else 0.05
+                if pending:
+                    oldest_sent, _ = next(iter(pending.values()))
+                    wait = min(wait, max(0.0, oldest_sent + timeout - now))
+                want_write = can_send and not paced
+                readable, writable, _ = select.select([self.sock], [self.sock] if want_write else [], [], wait)
+
+                if readable:
+                    while True:
+                        try:
+                            reply = self._read_reply()
+                        except (BlockingIOError, InterruptedError):
+                            break
+                        except OSError:
+                            break
+                        if reply is None:
+                            continue
+                        src, ident, reply_seq, ttl = reply
+                        if ident != self.ident:
+                            continue
+                        entry = pending.pop((src, reply_seq), None)
+                        if entry is None:
+                            continue
+                        sent_at, _ = entry
+                        if budget is not None:
+                            budget.release(src)
+                        results[src] = (round((time.perf_counter() - sent_at) * 1000, 3), ttl)
+
+                now = time.perf_counter()
+                while pending:
+                    key, (sent_at, attempt) = next(iter(pending.items()))
+                    if now - sent_at < timeout:
+                        break
+                    del pending[key]
+                    if budget is not None:
+                        budget.release(key[0])
+                    if attempt < retries and key[0] not in results:
+                        to_send.append((key[0], attempt + 1))
+        finally:
+            # interrupted mid-sweep, give back the slots of echoes still in flight
+            if budget is not None:
+                for ip, _ in pending:
+                    budget.release(ip)
+
+        return results
+
+
+def sweep(ips: Iterable[str], timeout: float = 1.0, retries: int = 0,
+          budget=None, limiter=None) -> Dict[str, Tuple[Optional[float], Optional[int]]]:
+    with ICMPSweeper() as sweeper:
+        return sweeper.sweep(ips, timeout, retries, budget=budget, limiter=limiter)
+
+
+if __name__ == "__main__": # Testing, whole 127.0.0.0/24 should answer
+    targets = [f"127.0.0.{i}" for i in range(1, 255)]
+    start = time.perf_counter()
+    found = sweep(targets)
+    print(f"{len(found)}/{len(targets)} answered in {time.perf_counter() - start:.3f}s")
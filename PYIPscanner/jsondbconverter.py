@@ -1,13 +1,100 @@
+import struct
 import json
+import sys
+import os
 
 file = "mac-vendors-export.json"
 target = "mac_vendors_list.json"
 
-with open(file, "r", encoding="utf-8") as f:
-    data = json.load(f)
-    converted = {}
-    for entry in data:
-        converted[entry["macPrefix"]] = entry['vendorName']
+"""
+    Two jobs:
+      1. convert the maclookup.app export into the slim {prefix: vendor} json (the original script)
+      2. build mac_vendors.idx from that json, a compact binary index that MAClookup mmaps
+         instead of json.load()-ing ~2MB on every start.
 
-    with open(target, "w", encoding="utf-8") as file:
-        json.dump(converted, file, indent=4, ensure_ascii=False)
+    Index layout (little endian, every section padded to 8 bytes):
+        header      4s magic "PYMV", u16 version, u16 reserved,
+                    u32 count MA-L, u32 count MA-M, u32 count MA-S, u32 vendor count, u32 strings size
+        MA-L        u32 prefixes (24 bit, sorted)  + u32 vendor ids
+        MA-M        u32 prefixes (28 bit, sorted)  + u32 vendor ids
+        MA-S        u64 prefixes (36 bit, sorted)  + u32 vendor ids
+        vendors     u32 offsets into strings (vendor count + 1)
+        strings     utf-8 vendor names, deduplicated
+"""
+
+INDEX_MAGIC = b"PYMV"
+INDEX_VERSION = 1
+HEADER = struct.Struct("<4sHHIIIII")
+
+# prefix string length -> (table, number of hex digits)
+PREFIX_KINDS = {8: ("L", 6), 10: ("M", 7), 13: ("S", 9)}
+
+
+def convert_export(src: str = file, dst: str = target):
+    with open(src, "r", encoding="utf-8") as f:
+        data = json.load(f)
+        converted = {}
+        for entry in data:
+            converted[entry["macPrefix"]] = entry['vendorName']
+
+        with open(dst, "w", encoding="utf-8") as out:
+            json.dump(converted, out, indent=4, ensure_ascii=False)
+
+
+def _pad(blob: bytearray):
+    blob.extend(b"\x00" * (-len(blob) % 8))
+
+
+def build_index(json_path: str = "mac_vendors.json", index_path: str = "mac_vendors.idx") -> int:
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    vendor_ids = {}
+    tables = {"L": [], "M": [], "S": []}
+    for prefix, vendor in data.items():
+        kind = PREFIX_KINDS.get(len(prefix))
+        if kind is None:
+            continue
+        table, digits = kind
+        hex_digits = prefix.replace(":", "").replace("-", "")[:digits]
+        try:
+            key = int(hex_digits, 16)
+        except ValueError:
+            continue
+        vendor_id = vendor_ids.setdefault(vendor, len(vendor_ids))
+        tables[table].append((key, vendor_id))
+
+    strings = bytearray()
+    offsets = []
+    for vendor in vendor_ids:  # dicts keep insertion order == id order
+        offsets.append(len(strings))
+        strings.extend(vendor.encode("utf-8"))
+    offsets.append(len(strings))
+
+    blob = bytearray(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, len(tables["L"]), len(tables["M"]),
+                                 len(tables["S"]), len(vendor_ids), len(strings)))
+    _pad(blob)
+    for table, key_format in (("L", "I"), ("M", "I"), ("S", "Q")):
+        rows = sorted(tables[table])
+        blob.extend(struct.pack(f"<{len(rows)}{key_format}", *(key for key, _ in rows)))
+        _pad(blob)
+        blob.extend(struct.pack(f"<{len(rows)}I", *(vendor_id for _, vendor_id in rows)))
+        _pad(blob)
+    blob.extend(struct.pack(f"<{len(offsets)}I", *offsets))
+    _pad(blob)
+    blob.extend(strings)
+
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(blob)
+    os.replace(tmp_path, index_path)
+    return sum(len(rows) for rows in tables.values())
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--index":
+        src = sys.argv[2] if len(sys.argv) > 2 else "mac_vendors.json"
+        dst = sys.argv[3] if len(sys.argv) > 3 else "mac_vendors.idx"
+        print(f"Indexed {build_index(src, dst)} prefixes into {dst}")
+    else:
+        convert_export()
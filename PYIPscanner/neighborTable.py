@@ -0,0 +1,106 @@
+from typing import Dict, Optional
+import subprocess
+import threading
+import time
+import re
+
+# Snapshot of the kernel neighbor (ARP) table. Read once per scan phase from
+# /proc/net/arp (or `ip neigh` if that's not there) and served from memory,
+# instead of one `arp -n <ip>` subprocess per live host.
+
+PROC_ARP = "/proc/net/arp"
+
+_MAC_PATTERN = re.compile(r'^([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2}$')
+_IP_NEIGH_PATTERN = re.compile(r'^(\d{1,3}(?:\.\d{1,3}){3})\s.*\blladdr\s+(([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2})')
+
+_EMPTY_MAC = "00:00:00:00:00:00"
+_ATF_COM = 0x02  # "completed" entry flag in /proc/net/arp
+
+
+def _read_proc_arp() -> Optional[Dict[str, str]]:
+    try:
+        with open(PROC_ARP, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+
+    table = {}
+    for line in lines[1:]:
+        parts = line.split()
+        if len(parts) < 4:
+            continue
+        ip, flags, mac = parts[0], parts[2], parts[3]
+        try:
+            if not int(flags, 16) & _ATF_COM:
+                continue
+        except ValueError:
+            continue
+        if mac == _EMPTY_MAC or not _MAC_PATTERN.match(mac):
+            continue
+        table[ip] = mac.upper()
+    return table
+
+
+def _read_ip_neigh() -> Optional[Dict[str, str]]:
+    try:
+        result = subprocess.run(
+            ['ip', '-4', 'neigh', 'show'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            encoding='utf-8',
+            timeout=2
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+    table = {}
+    for line in result.stdout.splitlines():
+        if 'FAILED' in line or 'INCOMPLETE' in line:
+            continue
+        match = _IP_NEIGH_PATTERN.match(line.strip())
+        if match:
+            table[match.group(1)] = match.group(2).upper()
+    return table
+
+
+class NeighborTable:
+    def __init__(self, min_refresh_interval: float = 1.0):
+        self.min_refresh_interval = min_refresh_interval
+        self.entries: Dict[str, str] = {}
+        self.refreshed_at = 0.0
+        self.supported = True
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False) -> bool:
+        with self._lock:
+            if not force and time.monotonic() - self.refreshed_at < self.min_refresh_interval:
+                return False
+
+            table = _read_proc_arp()
+            if table is None:
+                table = _read_ip_neigh()
+            if table is None:
+                self.supported = False
+                return False
+
+            self.entries = table
+            self.refreshed_at = time.monotonic()
+            return True
+
+    def lookup(self, ip: str, probed_at: Optional[float] = None) -> Optional[str]:
+        if not self.refreshed_at:
+            self.refresh(force=True)
+
+        mac = self.entries.get(ip)
+        if mac is not None:
+            return mac
+
+        # Miss: only worth re-reading if the host was probed after our snapshot
+        # (its entry may have just been created), and not more often than min_refresh_interval.
+        if probed_at is None or probed_at > self.refreshed_at:
+            if self.refresh():
+                return self.entries.get(ip)
+        return None
+
+
+NEIGHBORS = NeighborTable()
@@ -1,5 +1,6 @@
-from typing import List, Optional, Tuple
+from typing import Iterator, List, Optional, Tuple
 from CLIhelpers import *
+import bisect
 import re
 
 _IP_PATTERN = re.compile(r'^(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})$')
@@ -48,10 +49,6 @@ def parse_cidr(cidr: str) -> List[str]:
         num_ips = broadcast - network + 1
         if num_ips > 10000:
             print_warn(f"CIDR range contains {num_ips} IPs. This may take a while...")
-            response = input("Continue? (y/n): ")
-            if response.lower() != 'y':
-                print_error("Scan cancelled by user.")
-                return []
 
         return [int_to_ip(i) for i in range(network, broadcast + 1)]
 
@@ -100,4 +97,160 @@ def parse_port_range(range_str: str) -> List[int]:
                 out.append(int(p))
             except ValueError:
                 print_warn(f"Invalid port value: {p}, skipping.")
-    return sorted(set(out))
\ No newline at end of file
+    return sorted(set(out))
+
+
+def cidr_bounds(cidr: str) -> Optional[Tuple[int, int]]:
+    ip_part, prefix_str = cidr.split('/', 1)
+    try:
+        prefix = int(prefix_str)
+    except ValueError:
+        print_error(f"Invalid CIDR prefix: /{prefix_str}")
+        return None
+    if not (0 <= prefix <= 32):
+        print_error(f"Invalid CIDR prefix: /{prefix} (must be 0-32)")
+        return None
+    if not is_valid_ip(ip_part):
+        print_error(f"Invalid IP in CIDR: {ip_part}")
+        return None
+
+    mask = (0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF
+    network = ip_to_int(ip_part) & mask
+    return network, network | (~mask & 0xFFFFFFFF)
+
+def range_bounds(range_str: str) -> Optional[Tuple[int, int]]:
+    a, b = [x.strip() for x in range_str.split('-', 1)]
+    if '.' not in b:
+        # shorthand: 192.168.0.1-255
+        b = '.'.join(a.split('.')[:3] + [b])
+    if not is_valid_ip(a) or not is_valid_ip(b):
+        print_error(f"Invalid IP range: {range_str}")
+        return None
+    start, end = ip_to_int(a), ip_to_int(b)
+    return (start, end) if start <= end else (end, start)
+
+
+class TargetSet:
+    """Scan targets as merged [start, end] integer intervals.
+
+    Nothing gets expanded into strings until iteration, so a /8 costs a couple of
+    tuples instead of 16M strings, len() is O(intervals) and iteration is in IP order.
+    """
+
+    def __init__(self):
+        self._intervals: List[Tuple[int, int]] = []
+        self._merged = True
+        self._offsets: Optional[Tuple[List[int], List[int]]] = None   # (interval starts, addresses before each)
+
+    def add_interval(self, start: int, end: int):
+        self._intervals.append((start, end))
+        self._merged = False
+        self._offsets = None
+
+    def add_ip(self, ip: str) -> bool:
+        if not is_valid_ip(ip):
+            return False
+        n = ip_to_int(ip)
+        self.add_interval(n, n)
+        return True
+
+    def add_spec(self, spec: str) -> bool:
+        # one entry in any of the formats --range / --ips / --file accept
+        spec = spec.strip()
+        if not spec:
+            return False
+        if ',' in spec:
+            results = [self.add_spec(item) for item in parse_ip_list(spec)]
+            return any(results)
+        if '/' in spec:
+            bounds = cidr_bounds(spec)
+        elif '-' in spec:
+            bounds = range_bounds(spec)
+        else:
+            return self.add_ip(spec)
+        if bounds is None:
+            return False
+        self.add_interval(*bounds)
+        return True
+
+    def update(self, other: 'TargetSet'):
+        self._intervals.extend(other.intervals)
+        self._merged = False
+        self._offsets = None
+
+    def difference(self, other: 'TargetSet') -> 'TargetSet':
+        out = TargetSet()
+        holes = other.intervals
+        j = 0
+        for start, end in self.intervals:
+            while j < len(holes) and holes[j][1] < start:
+                j += 1
+            cur = start
+            k = j
+            while k < len(holes) and holes[k][0] <= end:
+                hole_start, hole_end = holes[k]
+                if hole_start > cur:
+                    out.add_interval(cur, hole_start - 1)
+                cur = max(cur, hole_end + 1)
+                if cur > end:
+                    break
+                k += 1
+            if cur <= end:
+                out.add_interval(cur, end)
+            j = k
+        return out
+
+    @property
+    def intervals(self) -> List[Tuple[int, int]]:
+        if not self._merged:
+            merged: List[Tuple[int, int]] = []
+            for start, end in sorted(self._intervals):
+                if merged and start <= merged[-1][1] + 1:
+                    if end > merged[-1][1]:
+                        merged[-1] = (merged[-1][0], end)
+                else:
+                    merged.append((start, end))
+            self._intervals = merged
+            self._merged = True
+        return self._intervals
+
+    def __len__(self) -> int:
+        return sum(end - start + 1 for start, end in self.intervals)
+
+    def __bool__(self) -> bool:
+        return bool(self._intervals)
+
+    def __contains__(self, ip: str) -> bool:
+        # same bisect over the interval starts as index()
+        return is_valid_ip(ip) and self.index(ip) >= 0
+
+    def index(self, ip: str) -> int:
+        # position of `ip` in iteration order, -1 if it isn't in the set
+        intervals = self.intervals
+        if self._offsets is None:
+            starts, before, seen = [], [], 0
+            for start, end in intervals:
+                starts.append(start)
+                before.append(seen)
+                seen += end - start + 1
+            self._offsets = (starts, before)
+        starts, before = self._offsets
+        n = ip_to_int(ip)
+        i = bisect.bisect_right(starts, n) - 1
+        if i < 0 or n > intervals[i][1]:
+            return -1
+        return before[i] + n - starts[i]
+
+    def ints(self) -> Iterator[int]:
+        for start, end in self.intervals:
+            yield from range(start, end + 1)
+
+    def __iter__(self) -> Iterator[str]:
+        for n in self.ints():
+            yield int_to_ip(n)
+
+    def max_ip_width(self) -> int:
+        # exact up to a /16 worth of addresses, beyond that just assume the widest possible
+        if len(self) > 65536:
+            return 15
+        return max((len(ip) for ip in self), default=0)
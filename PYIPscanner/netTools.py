@@ -1,52 +1,224 @@
+from typing import Iterable, Tuple
 from CLIhelpers import *
 from netHelpers import *
+from neighborTable import NEIGHBORS
+from portScanner import scan_ports, PORT_OPEN, PORT_TIMEOUT
+from portStats import PORT_STATS
+from probeBudget import BUDGET
+from dnsResolver import RESOLVER
+from rttEstimator import RTT
+from rateLimiter import RATE
+from stageTimer import PROFILER
+from dataclasses import dataclass
+import icmpSweep
 import concurrent.futures
 import subprocess
+import itertools
+import threading
 import platform
 import socket
+import time
 import re
 
 _IP_PATTERN = re.compile(r'^(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})$')
 _TIME_PATTERN = re.compile(r'time[=<](\d+(?:\.\d+)?)', re.IGNORECASE)
 _TTL_PATTERN = re.compile(r'ttl[=](\d+)', re.IGNORECASE)
+_WIN_MAC_PATTERN = re.compile(r'([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})')
+_MAC_PATTERN = re.compile(r'([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2}')
 
 SYSTEM = platform.system().lower()
 
+# single-host probes; answers from a batch sweep stay valid for the rest of the run, a
+# presweep of PRESWEEP_LIMIT targets or one SWEEP_CHUNK can take far longer than this to work through
+PROBE_MAX_AGE = 30.0
+
+# 'auto' = in-process ICMP sweeper when a socket can be opened, system ping otherwise
+PING_METHOD = 'auto'
+
+# Hosts that answer ping but drop every SYN: a few sentinel ports go first, and when all of
+# them time out the host is 'filtered'. 'reduced' still probes the rest with a short timeout
+# and no retries, 'stop' skips them, 'full' scans everything normally.
+FILTERED = '[filtered]'
+FILTERED_POLICY = 'reduced'
+SENTINEL_PORTS = (80, 443, 22, 445, 3389, 8080, 53, 25, 135, 139, 21, 23)
+SENTINEL_COUNT = 6
+FILTERED_TIMEOUT_SCALE = 0.25
+
+SWEEP_CHUNK = 65536
+PRESWEEP_LIMIT = 4 * 65536
+
+
+@dataclass
+class HostProbe:
+    alive: bool
+    rtt_ms: Optional[float] = None
+    ttl: Optional[int] = None
+    timeout_sec: float = 1
+    timestamp: float = 0.0
+    swept: bool = False
+
+# One echo per host, shared by is_alive/get_ping/get_ttl and the Ping/OS fields,
+# instead of a separate ping subprocess for each of them.
+_probe_cache: dict = {}
+_probe_lock = threading.Lock()
+
+
+def _ping_command(ip: str, timeout_sec: int = 1) -> Tuple[List[str], dict]:
+    popen_kwargs = {}
+
+    if SYSTEM == 'windows':
+        if hasattr(subprocess, 'STARTUPINFO'):
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            popen_kwargs['startupinfo'] = startupinfo
+        if hasattr(subprocess, 'CREATE_NO_WINDOW'):
+            popen_kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
+
+        cmd = ['ping', '-n', '1', '-w', str(timeout_sec * 1000), ip]
+    else:
+        cmd = ['ping', '-c', '1', '-W', str(timeout_sec), ip]
+
+    return cmd, popen_kwargs
 
+@PROFILER.timed('ping')
 def _run_ping(ip: str, timeout_sec: int = 1) -> Tuple[bool, Optional[str]]:
     try:
-        startupinfo = None
-        creation_flags = 0
+        cmd, popen_kwargs = _ping_command(ip, timeout_sec)
 
-        if SYSTEM == 'windows':
-            if hasattr(subprocess, 'STARTUPINFO'):
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            if hasattr(subprocess, 'CREATE_NO_WINDOW'):
-                creation_flags = subprocess.CREATE_NO_WINDOW
-
-            cmd = ['ping', '-n', '1', '-w', str(timeout_sec * 1000), ip]
-        else:
-            cmd = ['ping', '-c', '1', '-W', str(timeout_sec), ip]
-
-        res = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            encoding='utf-8',
-            timeout=timeout_sec + 0.5,
-            startupinfo=startupinfo,
-            creationflags=creation_flags
-        )
+        RATE.pace(ip)
+        with BUDGET.slot(ip):
+            res = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                encoding='utf-8',
+                timeout=timeout_sec + 0.5,
+                **popen_kwargs
+            )
 
         success = 'ttl=' in res.stdout.lower()
         return success, res.stdout if success else None
     except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
         return False, None
 
+def parse_ping_output(success: bool, stdout: Optional[str], timeout_sec: float = 1) -> HostProbe:
+    probe = HostProbe(alive=success, timeout_sec=timeout_sec, timestamp=time.monotonic())
+    if not success or not stdout:
+        return probe
+
+    match = _TIME_PATTERN.search(stdout)
+    if match:
+        try:
+            probe.rtt_ms = float(match.group(1))
+        except ValueError:
+            pass
+
+    match = _TTL_PATTERN.search(stdout)
+    if match:
+        try:
+            probe.ttl = int(match.group(1))
+        except ValueError:
+            pass
+
+    return probe
+
+def get_cached_probe(ip: str, timeout_sec: float = 1, max_age: float = PROBE_MAX_AGE) -> Optional[HostProbe]:
+    with _probe_lock:
+        probe = _probe_cache.get(ip)
+    if probe is None or (not probe.swept and time.monotonic() - probe.timestamp > max_age):
+        return None
+    # a dead answer from a shorter timeout doesn't prove much for a longer one
+    if not probe.alive and probe.timeout_sec < timeout_sec:
+        return None
+    return probe
+
+def store_probe(ip: str, probe: HostProbe) -> HostProbe:
+    with _probe_lock:
+        _probe_cache[ip] = probe
+    RTT.observe(ip, probe.rtt_ms)
+    return probe
+
+def clear_probe_cache():
+    with _probe_lock:
+        _probe_cache.clear()
+
+def set_ping_method(method: str) -> str:
+    global PING_METHOD
+    if method in ('auto', 'icmp') and not icmpSweep.available():
+        if method == 'icmp':
+            print_warn("In-process ICMP is not available (no ping_group_range / CAP_NET_RAW), using system ping.")
+        method = 'system'
+    PING_METHOD = 'icmp' if method in ('auto', 'icmp') else 'system'
+    return PING_METHOD
+
+def uses_icmp_sweeper() -> bool:
+    if PING_METHOD == 'auto':
+        set_ping_method('auto')
+    return PING_METHOD == 'icmp'
+
+@PROFILER.timed('icmp_sweep')
+def sweep_batch(batch: List[str], timeout_sec: float = 1) -> Optional[int]:
+    # One sweep for every IP of `batch` that has no fresh probe yet, results go to the probe cache.
+    if not uses_icmp_sweeper():
+        return None
+    todo = [ip for ip in batch if get_cached_probe(ip, timeout_sec) is None]
+    if not todo:
+        return 0
+    try:
+        answers = icmpSweep.sweep(todo, timeout_sec, budget=BUDGET, limiter=RATE)
+    except OSError:
+        return None
+
+    now = time.monotonic()
+    with _probe_lock:
+        for ip in todo:
+            rtt_ms, ttl = answers.get(ip, (None, None))
+            _probe_cache[ip] = HostProbe(alive=ip in answers, rtt_ms=rtt_ms, ttl=ttl,
+                                         timeout_sec=timeout_sec, timestamp=now, swept=True)
+    for ip, (rtt_ms, _) in answers.items():
+        RTT.observe(ip, rtt_ms)
+    return len(answers)
+
+def sweep_hosts(ips: Iterable[str], timeout_sec: float = 1, chunk: int = SWEEP_CHUNK) -> Optional[int]:
+    # Pre-fills the probe cache for a whole batch from one socket. Returns the number of
+    # hosts that answered, or None when the sweeper isn't usable (probes stay lazy/per-host).
+    # Every target gets a cache entry, so huge target sets (> PRESWEEP_LIMIT) skip this and
+    # get swept chunk by chunk by the scan's discovery stage instead.
+    if not uses_icmp_sweeper() or len(ips) > PRESWEEP_LIMIT:
+        return None
+
+    answered = 0
+    source = iter(ips)
+    while True:
+        batch = list(itertools.islice(source, chunk))
+        if not batch:
+            break
+        swept = sweep_batch(batch, timeout_sec)
+        if swept is None:
+            return None
+        answered += swept
+    return answered
+
+@PROFILER.timed('probe')
+def probe_host(ip: str, timeout_sec: int = 1, max_age: float = PROBE_MAX_AGE) -> HostProbe:
+    cached = get_cached_probe(ip, timeout_sec, max_age)
+    if cached is not None:
+        return cached
+
+    if uses_icmp_sweeper():
+        try:
+            answers = icmpSweep.sweep([ip], timeout_sec, budget=BUDGET, limiter=RATE)
+            rtt_ms, ttl = answers.get(ip, (None, None))
+            return store_probe(ip, HostProbe(alive=ip in answers, rtt_ms=rtt_ms, ttl=ttl,
+                                             timeout_sec=timeout_sec, timestamp=time.monotonic()))
+        except OSError:
+            pass
+
+    success, stdout = _run_ping(ip, timeout_sec)
+    return store_probe(ip, parse_ping_output(success, stdout, timeout_sec))
+
 def is_alive(ip: str, timeout_sec: int = 1) -> bool:
-    success, _ = _run_ping(ip, timeout_sec)
-    return success
+    return probe_host(ip, timeout_sec).alive
 
 def is_port_open(ip: str, port: int, timeout: float = 0.5) -> bool:
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -59,58 +231,70 @@ def is_port_open(ip: str, port: int, timeout: float = 0.5) -> bool:
     finally:
         sock.close()
 
-def get_open_ports(ip: str, ports: List[int] = None, timeout: float = 0.5, max_workers: int = 100) -> List[int]:
-    if ports is None:
-        ports = [443, 80, 8080, 9443, 8123, 8008, 8888, 8088, 5000, 3000, 22, 21, 3306, 5432, 6379]
+def set_filtered_policy(policy: str):
+    global FILTERED_POLICY
+    FILTERED_POLICY = policy
+
+def sentinel_split(ports: List[int]) -> Tuple[List[int], List[int]]:
+    # (sentinels, rest); short lists and --filtered-hosts full have no sentinel stage
+    if FILTERED_POLICY == 'full' or len(ports) <= SENTINEL_COUNT * 2:
+        return [], ports
+    wanted = set(ports)
+    preferred = [port for port in SENTINEL_PORTS if port in wanted]
+    sentinels = (preferred + [port for port in ports if port not in preferred])[:SENTINEL_COUNT]
+    chosen = set(sentinels)
+    return sentinels, [port for port in ports if port not in chosen]
+
+def filtered_timeout(timeout: float, rtt_ms: Optional[float] = None) -> Optional[float]:
+    # connect timeout for what's left of a host whose sentinels all timed out, None = leave it.
+    # Below --timeout-floor on purpose, but never under twice the host's ping RTT.
+    if FILTERED_POLICY == 'stop':
+        return None
+    least = 2 * rtt_ms / 1000 if rtt_ms else RTT.floor
+    return min(timeout, max(least, timeout * FILTERED_TIMEOUT_SCALE))
 
+@PROFILER.timed('open_ports')
+def scan_host_ports(ip: str, ports: List[int], timeout: float = 0.5, max_workers: int = 100,
+                    retries: int = 0, rtt_ms: Optional[float] = None) -> Tuple[List[int], bool]:
+    """(open ports, filtered), filtered meaning not a single probe got an answer."""
     if not ports:
-        return []
-
-    open_ports = []
-    workers = min(max_workers, len(ports), 200)
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
-        future_to_port = {ex.submit(is_port_open, ip, port, timeout): port for port in ports}
-
-        for future in concurrent.futures.as_completed(future_to_port):
-            port = future_to_port[future]
-            try:
-                if future.result():
-                    open_ports.append(port)
-            except Exception:
-                pass
-
-    return sorted(open_ports)
+        return [], False
+    first_hit = PORT_STATS.first_hit
+
+    def scan(port_list: List[int], timeout: float, retries: int) -> dict:
+        # max_workers caps in-flight connects of the non-blocking scanner (single thread)
+        return scan_ports(ip, port_list, timeout, max_in_flight=max(1, min(max_workers, len(port_list))),
+                          budget=BUDGET, retries=retries, limiter=RATE, stop_on_open=first_hit)
+
+    sentinels, rest = sentinel_split(PORT_STATS.order(ip, ports))
+    states = scan(sentinels, timeout, retries) if sentinels else {}
+    if first_hit and PORT_OPEN in states.values():
+        pass
+    elif sentinels and all(state == PORT_TIMEOUT for state in states.values()):
+        reduced = filtered_timeout(timeout, rtt_ms)
+        if reduced is None:
+            return [], True
+        states.update(scan(rest, reduced, 0))
+    elif rest:
+        states.update(scan(rest, timeout, retries))
+    open_ports = sorted(port for port, state in states.items() if state == PORT_OPEN)
+    filtered = all(state == PORT_TIMEOUT for state in states.values())
+    if not filtered:
+        # a firewalled host says nothing about which ports tend to be open
+        PORT_STATS.record(ip, states, open_ports)
+    return open_ports, filtered
+
+def get_open_ports(ip: str, ports: List[int] = None, timeout: float = 0.5, max_workers: int = 100,
+                   retries: int = 0) -> List[int]:
+    if ports is None:
+        ports = [443, 80, 8080, 9443, 8123, 8008, 8888, 8088, 5000, 3000, 22, 21, 3306, 5432, 6379]
+    return scan_host_ports(ip, ports, timeout, max_workers, retries)[0]
 
 def get_ping(ip: str, timeout_sec: int = 2) -> Optional[float]:
-    success, stdout = _run_ping(ip, timeout_sec)
-
-    if not success or not stdout:
-        return None
-
-    match = _TIME_PATTERN.search(stdout)
-    if match:
-        try:
-            return float(match.group(1))
-        except ValueError:
-            pass
-
-    return None
+    return probe_host(ip, timeout_sec).rtt_ms
 
 def get_ttl(ip: str, timeout_sec: int = 1) -> Optional[int]:
-    success, stdout = _run_ping(ip, timeout_sec)
-
-    if not success or not stdout:
-        return None
-
-    match = _TTL_PATTERN.search(stdout)
-    if match:
-        try:
-            return int(match.group(1))
-        except ValueError:
-            pass
-
-    return None
+    return probe_host(ip, timeout_sec).ttl
 
 def detect_os_from_ttl(ttl: Optional[int]) -> str:
     if ttl is None:
@@ -127,50 +311,62 @@ def detect_os_from_ttl(ttl: Optional[int]) -> str:
     else:
         return f'Unknown'
 
+@PROFILER.timed('mac')
 def get_mac_address(ip: str) -> Optional[str]:
+    if SYSTEM == 'linux' and NEIGHBORS.supported:
+        with _probe_lock:
+            probe = _probe_cache.get(ip)
+        # `arp -n` would read the same kernel table, so a miss here (after the refresh
+        # lookup() already did) is final; the subprocess is only for systems without a snapshot
+        return NEIGHBORS.lookup(ip, probe.timestamp if probe else None)
+
     try:
-        if SYSTEM == 'windows':
-            result = subprocess.run(
-                ['arp', '-a', ip],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.DEVNULL,
-                encoding='utf-8',
-                timeout=2,
-                creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0
-            )
+        RATE.pace(ip)
+        with BUDGET.slot(ip):
+            return _arp_lookup(ip)
+    except (subprocess.SubprocessError, subprocess.TimeoutExpired, OSError):
+        return None
 
-            mac_pattern = re.compile(r'([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})')
-            match = mac_pattern.search(result.stdout)
-            if match:
-                mac = match.group(0).replace('-', ':').upper()
-                return mac
-        else:
-            result = subprocess.run(
-                ['arp', '-n', ip],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.DEVNULL,
-                encoding='utf-8',
-                timeout=2
-            )
+def _arp_lookup(ip: str) -> Optional[str]:
+    if SYSTEM == 'windows':
+        result = subprocess.run(
+            ['arp', '-a', ip],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            encoding='utf-8',
+            timeout=2,
+            creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0
+        )
+
+        match = _WIN_MAC_PATTERN.search(result.stdout)
+        if match:
+            mac = match.group(0).replace('-', ':').upper()
+            return mac
+    else:
+        result = subprocess.run(
+            ['arp', '-n', ip],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            encoding='utf-8',
+            timeout=2
+        )
 
-            mac_pattern = re.compile(r'([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2}')
-            match = mac_pattern.search(result.stdout)
-            if match:
-                return match.group(0).upper()
+        match = _MAC_PATTERN.search(result.stdout)
+        if match:
+            return match.group(0).upper()
 
-        return None
-    except (subprocess.SubprocessError, subprocess.TimeoutExpired):
-        return None
+    return None
 
+@PROFILER.timed('hostname')
 def get_hostname(ip: str, timeout: float = 1.0) -> Optional[str]:
+    # shared pipelined PTR resolver (cached, one socket), libc only where there's no resolv.conf
+    if RESOLVER.available:
+        return RESOLVER.resolve(ip, timeout + 0.5)
+
     try:
-        old_timeout = socket.getdefaulttimeout()
-        socket.setdefaulttimeout(timeout)
-        try:
-            hostname = socket.gethostbyaddr(ip)[0]
-            return hostname
-        finally:
-            socket.setdefaulttimeout(old_timeout)
+        RATE.pace()  # goes to the nameserver, not the target's subnet
+        with BUDGET.slot(ip):
+            return socket.gethostbyaddr(ip)[0]
     except (socket.herror, socket.gaierror, socket.timeout):
         return None
 
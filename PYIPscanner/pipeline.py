@@ -0,0 +1,130 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import deque
+import concurrent.futures
+import itertools
+
+# Streaming pieces used by scanner.main: a bounded submission window so only `window`
+# futures exist at any time (flat memory on /16s), results handed out in completion
+# order, a two-stage (discovery -> enrichment) variant of the same, and a reorder
+# buffer for when the output has to stay in input order.
+
+
+def stream_completed(executor: concurrent.futures.Executor, fn: Callable, items: Iterable,
+                     window: int, *args) -> Iterator[Tuple[int, Any, Any]]:
+    """Yields (index, item, result_or_exception) as futures finish, never more than `window` in flight."""
+    source = iter(enumerate(items))
+    in_flight: Dict[concurrent.futures.Future, Tuple[int, Any]] = {}
+    window = max(1, window)
+
+    def fill():
+        for idx, item in itertools.islice(source, window - len(in_flight)):
+            in_flight[executor.submit(fn, item, *args)] = (idx, item)
+
+    fill()
+    try:
+        while in_flight:
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in done:
+                idx, item = in_flight.pop(fut)
+                try:
+                    outcome = fut.result()
+                except Exception as e:
+                    outcome = e
+                yield idx, item, outcome
+            fill()
+    finally:
+        for fut in in_flight:
+            fut.cancel()
+
+
+def stream_staged(discover_executor: concurrent.futures.Executor, enrich_executor: concurrent.futures.Executor,
+                  discover: Callable, enrich: Callable, items: Iterable, discovery_window: int, enrich_window: int,
+                  batch_size: int = 0, before_batch: Optional[Callable[[List], Any]] = None
+                  ) -> Iterator[Tuple[int, Any, Any]]:
+    """Like stream_completed, but in two pools.
+
+    discover(item) -> (finished, value) runs for every item; finished values are yielded
+    right away, the rest go through enrich(item, value) on the second pool. Discovery
+    stops pulling new items while the enrichment backlog is full. With `batch_size`,
+    items are pulled in batches and before_batch(batch) runs once per batch first
+    (e.g. one ICMP sweep for the whole batch).
+    """
+    source = iter(enumerate(items))
+    pulled: deque = deque()
+    backlog: deque = deque()
+    discovering: Dict[concurrent.futures.Future, Tuple[int, Any]] = {}
+    enriching: Dict[concurrent.futures.Future, Tuple[int, Any]] = {}
+    discovery_window = max(1, discovery_window)
+    enrich_window = max(1, enrich_window)
+
+    def pull():
+        if not pulled:
+            batch = list(itertools.islice(source, batch_size or 1))
+            if batch and before_batch is not None:
+                before_batch([item for _, item in batch])
+            pulled.extend(batch)
+        return pulled.popleft() if pulled else None
+
+    def fill():
+        while backlog and len(enriching) < enrich_window:
+            idx, item, value = backlog.popleft()
+            enriching[enrich_executor.submit(enrich, item, value)] = (idx, item)
+        while len(discovering) < discovery_window and len(backlog) < enrich_window:
+            nxt = pull()
+            if nxt is None:
+                break
+            idx, item = nxt
+            discovering[discover_executor.submit(discover, item)] = (idx, item)
+
+    fill()
+    try:
+        while discovering or enriching:
+            done, _ = concurrent.futures.wait(itertools.chain(discovering, enriching),
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in done:
+                if fut in discovering:
+                    idx, item = discovering.pop(fut)
+                    try:
+                        finished, value = fut.result()
+                    except Exception as e:
+                        finished, value = True, e
+                    if not finished:
+                        backlog.append((idx, item, value))
+                        continue
+                    yield idx, item, value
+                else:
+                    idx, item = enriching.pop(fut)
+                    try:
+                        outcome = fut.result()
+                    except Exception as e:
+                        outcome = e
+                    yield idx, item, outcome
+            fill()
+    finally:
+        for fut in itertools.chain(discovering, enriching):
+            fut.cancel()
+
+
+class ReorderBuffer:
+    """Holds completion-ordered results back until everything before them has arrived."""
+
+    def __init__(self, start: int = 0):
+        self.next_index = start
+        self.pending: Dict[int, Any] = {}
+
+    def push(self, idx: int, item: Any) -> List[Any]:
+        self.pending[idx] = item
+        ready = []
+        while self.next_index in self.pending:
+            ready.append(self.pending.pop(self.next_index))
+            self.next_index += 1
+        return ready
+
+    def flush(self) -> List[Any]:
+        # scan ended early (Ctrl-C / error): whatever we have, still in order, gaps skipped
+        ready = [self.pending[idx] for idx in sorted(self.pending)]
+        self.pending.clear()
+        return ready
+
+    def __len__(self):
+        return len(self.pending)
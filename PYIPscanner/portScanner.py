@@ -0,0 +1,179 @@
+from typing import Dict, Iterable, List, Tuple
+import selectors
+import socket
+import struct
+import errno
+import heapq
+import time
+
+# Non-blocking connect() scanner. Thousands of connects are started from one thread,
+# completions come from the selector (epoll on linux), deadlines live in a timer heap.
+# Sockets are closed with SO_LINGER 0 (RST instead of FIN) so scans don't pile up
+# ephemeral ports in TIME_WAIT.
+
+PORT_OPEN = 'open'
+PORT_REFUSED = 'refused'
+PORT_TIMEOUT = 'timeout'
+PORT_ERROR = 'error'
+
+_LINGER_RST = struct.pack('ii', 1, 0)
+
+_IN_PROGRESS = {errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, getattr(errno, 'WSAEWOULDBLOCK', -1)}
+
+
+def _classify(err: int) -> str:
+    if err == 0 or err == errno.EISCONN:
+        return PORT_OPEN
+    if err == errno.ECONNREFUSED:
+        return PORT_REFUSED
+    if err == errno.ETIMEDOUT:
+        return PORT_TIMEOUT
+    return PORT_ERROR
+
+
+def _close(sock: socket.socket):
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RST)
+    except OSError:
+        pass
+    sock.close()
+
+
+class PortScanner:
+    def __init__(self, max_in_flight: int = 1024, budget=None, limiter=None):
+        self.max_in_flight = max(1, max_in_flight)
+        self.budget = budget
+        self.limiter = limiter
+
+    def _release(self, target: Tuple[str, int]):
+        if self.budget is not None:
+            self.budget.release(target[0])
+
+    def scan(self, targets: Iterable[Tuple[str, int]], timeout: float = 0.5,
+             stop_on_open: bool = False) -> Dict[Tuple[str, int], str]:
+        """Returns {(ip, port): state} for every target, state is one of the PORT_* constants.
+        With stop_on_open nothing new is started after the first open port, and targets that
+        were still pending are left out of the result."""
+        results: Dict[Tuple[str, int], str] = {}
+        stopped = False
+        queue = iter(targets)
+        exhausted = False
+        carry = None
+
+        selector = selectors.DefaultSelector()
+        in_flight: Dict[int, Tuple[socket.socket, Tuple[str, int], int]] = {}
+        timers: List[Tuple[float, int, int]] = []
+        counter = 0
+        send_at = None  # carried target already holds a limiter token and may go out at this time
+
+        try:
+            while True:
+                while not exhausted and len(in_flight) < self.max_in_flight:
+                    target, carry = carry or next(queue, None), None
+                    if target is None:
+                        exhausted = True
+                        break
+
+                    if self.limiter is not None:
+                        now = time.monotonic()
+                        if send_at is None:
+                            send_at = now + self.limiter.reserve(target[0])
+                        if send_at > now:
+                            if in_flight:
+                                carry = target
+                                break
+                            time.sleep(send_at - now)
+
+                    if self.budget is not None and not self.budget.try_acquire(target[0]):
+                        if in_flight:
+                            carry = target  # wait for some of our own connects to finish first
+                            break
+                        self.budget.acquire(target[0])
+                    send_at = None
+
+                    try:
+                        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    except OSError:
+                        results[target] = PORT_ERROR  # out of fds
+                        self._release(target)
+                        continue
+                    sock.setblocking(False)
+                    err = sock.connect_ex(target)
+
+                    if err in _IN_PROGRESS:
+                        fd = sock.fileno()
+                        counter += 1
+                        in_flight[fd] = (sock, target, counter)
+                        selector.register(sock, selectors.EVENT_WRITE, target)
+                        heapq.heappush(timers, (time.monotonic() + timeout, counter, fd))
+                    else:
+                        results[target] = _classify(err)
+                        _close(sock)
+                        self._release(target)
+                        if stop_on_open and results[target] == PORT_OPEN:
+                            stopped = True
+                            break
+
+                if stopped:
+                    break
+
+                if not in_flight:
+                    if exhausted and carry is None:
+                        break
+                    continue
+
+                wait = max(0.0, timers[0][0] - time.monotonic()) if timers else timeout
+                if send_at is not None and send_at > time.monotonic():
+                    wait = min(wait, send_at - time.monotonic())
+                for key, _ in selector.select(wait):
+                    sock = key.fileobj
+                    fd = sock.fileno()
+                    err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    results[key.data] = _classify(err)
+                    selector.unregister(sock)
+                    del in_flight[fd]
+                    _close(sock)
+                    self._release(key.data)
+                    if stop_on_open and results[key.data] == PORT_OPEN:
+                        stopped = True
+                if stopped:
+                    break
+
+                now = time.monotonic()
+                while timers and timers[0][0] <= now:
+                    _, timer_id, fd = heapq.heappop(timers)
+                    entry = in_flight.get(fd)
+                    # already finished, or the fd got reused by a newer connect
+                    if entry is None or entry[2] != timer_id:
+                        continue
+                    sock, target, _ = entry
+                    results[target] = PORT_TIMEOUT
+                    selector.unregister(sock)
+                    del in_flight[fd]
+                    _close(sock)
+                    self._release(target)
+        finally:
+            for sock, target, _ in in_flight.values():
+                if not stopped:
+                    results.setdefault(target, PORT_TIMEOUT)
+                _close(sock)
+                self._release(target)
+            selector.close()
+
+        return results
+
+
+def scan_ports(ip: str, ports: List[int], timeout: float = 0.5, max_in_flight: int = 1024,
+               budget=None, retries: int = 0, limiter=None, stop_on_open: bool = False) -> Dict[int, str]:
+    scanner = PortScanner(max_in_flight, budget, limiter)
+    states = {port: state for (_, port), state in
+              scanner.scan(((ip, port) for port in ports), timeout, stop_on_open).items()}
+    for _ in range(retries):
+        if stop_on_open and PORT_OPEN in states.values():
+            break
+        again = [port for port, state in states.items() if state == PORT_TIMEOUT]
+        if not again:
+            break
+        for (_, port), state in scanner.scan(((ip, port) for port in again), timeout, stop_on_open).items():
+            states[port] = state
+    return states
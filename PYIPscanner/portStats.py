@@ -0,0 +1,119 @@
+from typing import Dict, Iterable, List, Optional
+from probeBudget import subnet_of
+import threading
+import sqlite3
+
+# Port order learned from what was actually found open: per /24 and overall, kept in
+# the scan cache database between runs. A host's ports are probed most-likely-open
+# first; a subnet with little history leans on the overall numbers, and ports nobody
+# has seen open keep the order they were given in. With --first-hit the port scan of a
+# host stops at its first open port, which is all a host/alive classification needs.
+
+GLOBAL = '*'
+PRIOR_WEIGHT = 4   # probes of a subnet before its own numbers outweigh the overall ones
+
+
+class PortStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # subnet (or GLOBAL) -> port -> [scanned, open]; _delta holds what this run added
+        self._stats: Dict[str, Dict[int, List[int]]] = {}
+        self._delta: Dict[str, Dict[int, List[int]]] = {}
+        self.path: Optional[str] = None
+        self.configure()
+
+    def configure(self, learn: bool = True, first_hit: bool = False):
+        self.learn = learn
+        self.first_hit = first_hit
+
+    def load(self, path: str):
+        # counts from earlier runs, written back (added to, not overwritten) by save()
+        self.path = path
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS port_stats ("
+                " subnet TEXT NOT NULL, port INTEGER NOT NULL, scanned INTEGER NOT NULL, open INTEGER NOT NULL,"
+                " PRIMARY KEY (subnet, port)) WITHOUT ROWID"
+            )
+            conn.commit()
+            rows = conn.execute("SELECT subnet, port, scanned, open FROM port_stats").fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            for subnet, port, scanned, opened in rows:
+                self._stats.setdefault(subnet, {})[port] = [scanned, opened]
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            # ports never seen open order the same as ports never probed, no point storing them
+            rows = [(subnet, port, scanned, opened)
+                    for subnet, ports in self._delta.items() for port, (scanned, opened) in ports.items()
+                    if self._stats[subnet][port][1] > 0]
+            self._delta = {}
+        path, self.path = self.path, None
+        if not rows:
+            return
+        conn = sqlite3.connect(path, timeout=10)
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO port_stats VALUES (?, ?, ?, ?) ON CONFLICT (subnet, port) DO UPDATE SET"
+                    " scanned = scanned + excluded.scanned, open = open + excluded.open", rows
+                )
+        finally:
+            conn.close()
+
+    def record(self, ip: str, scanned: Iterable[int], open_ports: Iterable[int]):
+        if not self.learn:
+            return
+        scanned = list(scanned)
+        opened = set(open_ports)
+        with self._lock:
+            for subnet in (subnet_of(ip), GLOBAL):
+                stats = self._stats.setdefault(subnet, {})
+                delta = self._delta.setdefault(subnet, {})
+                for port in scanned:
+                    hit = port in opened
+                    for table in (stats, delta):
+                        counts = table.get(port)
+                        if counts is None:
+                            table[port] = [1, int(hit)]
+                        else:
+                            counts[0] += 1
+                            counts[1] += hit
+
+    def order(self, ip: str, ports: List[int]) -> List[int]:
+        if not self.learn:
+            return ports
+        with self._lock:
+            overall = self._stats.get(GLOBAL)
+            if not overall:
+                return ports
+            local = self._stats.get(subnet_of(ip), {})
+
+            def score(port: int) -> float:
+                scanned, opened = overall.get(port, (0, 0))
+                prior = opened / scanned if scanned else 0.0
+                scanned, opened = local.get(port, (0, 0))
+                return (opened + PRIOR_WEIGHT * prior) / (scanned + PRIOR_WEIGHT)
+
+            # sorted() is stable: ties (typically "never seen open") keep the given order
+            return sorted(ports, key=lambda port: -score(port))
+
+
+PORT_STATS = PortStats()
+
+
+if __name__ == "__main__": # Testing
+    stats = PortStats()
+    ports = [443, 80, 22, 3389, 8080]
+    for i in range(10):
+        stats.record(f"10.0.0.{i}", ports, [22] if i % 2 else [22, 3389])
+    for i in range(6):
+        stats.record(f"10.0.1.{i}", ports, [8080])
+    print(stats.order("10.0.0.50", ports))   # 22, 3389 first
+    print(stats.order("10.0.1.50", ports))   # 8080 first in its own /24
+    print(stats.order("10.0.2.1", ports))    # unknown /24: overall numbers
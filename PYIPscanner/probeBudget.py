@@ -0,0 +1,182 @@
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+import collections
+import threading
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+# Scan-wide cap on in-flight probes (ICMP echoes, connects, DNS lookups, arp/ping
+# subprocesses), with optional per-host and per-/24 caps. Every probe type takes a
+# slot from the same BUDGET, so the total number of open sockets/fds stays below the
+# process fd limit no matter how --workers and the port list multiply out.
+
+FD_RESERVE = 128         # fds left for stdout, csv, WOL server, python itself...
+MAX_DEFAULT_TOTAL = 16384
+FALLBACK_TOTAL = 512
+GRANT_SCAN = 256         # queued requests looked at per release when host/subnet caps are set
+
+
+def fd_limit() -> Optional[int]:
+    if resource is None:
+        return None
+    try:
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (OSError, ValueError):
+        return None
+    if soft == resource.RLIM_INFINITY:
+        return None
+    return soft
+
+
+def default_total() -> int:
+    limit = fd_limit()
+    if limit is None:
+        return FALLBACK_TOTAL
+    return max(16, min(MAX_DEFAULT_TOTAL, limit - FD_RESERVE))
+
+
+class ScanCancelled(Exception):
+    # raised to probes still waiting for a slot (or a rate token) after Ctrl-C
+    pass
+
+
+def subnet_of(ip: str) -> str:
+    return ip.rsplit('.', 1)[0]
+
+
+class ProbeBudget:
+    def __init__(self, total: Optional[int] = None, per_host: Optional[int] = None,
+                 per_subnet: Optional[int] = None):
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.peak = 0
+        self._hosts: Dict[str, int] = {}
+        self._subnets: Dict[str, int] = {}
+        self._queued: collections.deque = collections.deque()
+        self.configure(total, per_host, per_subnet)
+
+    def configure(self, total: Optional[int] = None, per_host: Optional[int] = None,
+                  per_subnet: Optional[int] = None):
+        with self._cond:
+            self.total = total if total and total > 0 else default_total()
+            self.per_host = per_host if per_host and per_host > 0 else None
+            self.per_subnet = per_subnet if per_subnet and per_subnet > 0 else None
+            self.cancelled = False
+            self._cond.notify_all()
+
+    def cancel(self):
+        # blocking acquires raise ScanCancelled from now on (waiters included), try_acquire
+        # just says no, so background loops like the PTR resolver stop starting new work
+        with self._cond:
+            self.cancelled = True
+            self._cond.notify_all()
+
+    def _fits(self, ip: str, count: int) -> bool:
+        # a single oversized request is let through when nothing else is running,
+        # otherwise it could never be served
+        if self.in_flight and self.in_flight + count > self.total:
+            return False
+        if self.per_host is not None:
+            used = self._hosts.get(ip, 0)
+            if used and used + count > self.per_host:
+                return False
+        if self.per_subnet is not None:
+            used = self._subnets.get(subnet_of(ip), 0)
+            if used and used + count > self.per_subnet:
+                return False
+        return True
+
+    def _take(self, ip: str, count: int):
+        self.in_flight += count
+        self.peak = max(self.peak, self.in_flight)
+        if self.per_host is not None:
+            self._hosts[ip] = self._hosts.get(ip, 0) + count
+        if self.per_subnet is not None:
+            subnet = subnet_of(ip)
+            self._subnets[subnet] = self._subnets.get(subnet, 0) + count
+
+    def try_acquire(self, ip: str, count: int = 1) -> bool:
+        with self._cond:
+            if self.cancelled or not self._fits(ip, count):
+                return False
+            self._take(ip, count)
+            return True
+
+    def acquire(self, ip: str, count: int = 1, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.cancelled or self._fits(ip, count), timeout):
+                return False
+            if self.cancelled:
+                raise ScanCancelled()
+            self._take(ip, count)
+            return True
+
+    def acquire_or_queue(self, ip: str, count: int, callback: Callable[[], None]) -> Optional[list]:
+        # For callers that can't block (the asyncio engine): returns None if the slot was
+        # taken right away, otherwise a queue entry. Once a release frees room the slot is
+        # taken on the caller's behalf and callback() runs on the releasing thread.
+        with self._cond:
+            if self.cancelled:
+                raise ScanCancelled()
+            if self._fits(ip, count):
+                self._take(ip, count)
+                return None
+            entry = [ip, count, callback]
+            self._queued.append(entry)
+            return entry
+
+    def cancel_queued(self, entry: list) -> bool:
+        # False means the slot was already granted and the caller has to release() it
+        with self._cond:
+            try:
+                self._queued.remove(entry)
+                return True
+            except ValueError:
+                return False
+
+    def _grant_queued(self) -> List[Callable[[], None]]:
+        granted = []
+        for _ in range(min(len(self._queued), GRANT_SCAN)):
+            if self.in_flight >= self.total:
+                break
+            ip, count, callback = self._queued[0]
+            if self._fits(ip, count):
+                self._queued.popleft()
+                self._take(ip, count)
+                granted.append(callback)
+            elif self.per_host is None and self.per_subnet is None:
+                break  # only the total cap applies, nothing behind the head can fit either
+            else:
+                self._queued.rotate(-1)
+        return granted
+
+    def release(self, ip: str, count: int = 1):
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - count)
+            if ip in self._hosts:
+                self._hosts[ip] -= count
+                if self._hosts[ip] <= 0:
+                    del self._hosts[ip]
+            subnet = subnet_of(ip)
+            if subnet in self._subnets:
+                self._subnets[subnet] -= count
+                if self._subnets[subnet] <= 0:
+                    del self._subnets[subnet]
+            granted = self._grant_queued() if self._queued else []
+            self._cond.notify_all()
+        for callback in granted:
+            callback()
+
+    @contextmanager
+    def slot(self, ip: str, count: int = 1):
+        self.acquire(ip, count)
+        try:
+            yield
+        finally:
+            self.release(ip, count)
+
+
+BUDGET = ProbeBudget()
@@ -0,0 +1,135 @@
+from typing import Dict, Optional
+from probeBudget import subnet_of, ScanCancelled
+import threading
+import time
+
+# --rate: token buckets that pace probe *starts* (ICMP echoes, connects, DNS queries,
+# ping/arp subprocesses) for the whole scan, optionally with a second, tighter bucket
+# per destination /24. BUDGET caps how many probes are in flight, this caps how fast
+# new ones go out.
+#
+# Callers reserve a token and get back how long to wait before sending. Tokens may go
+# negative, so concurrent callers queue up behind each other instead of all waking at
+# the same refill.
+
+
+def parse_rate(value: str) -> Optional[float]:
+    # "500", "500/s", "30000/m" -> packets per second
+    value = value.strip().lower()
+    per = 1.0
+    if value.endswith(('/s', '/sec')):
+        value = value.split('/')[0]
+    elif value.endswith(('/m', '/min')):
+        value, per = value.split('/')[0], 60.0
+    try:
+        rate = float(value) / per
+    except ValueError:
+        return None
+    return rate if rate > 0 else None
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RateLimiter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self.configure(None)
+
+    def configure(self, rate: Optional[float], per_subnet: Optional[float] = None, burst: Optional[float] = None):
+        with self._lock:
+            self.rate = rate
+            self.per_subnet = per_subnet
+            # the global bucket's size as it's actually used (default rate/10, at least one probe)
+            self.burst = max(1.0, burst or rate / 10) if rate else None
+            self._global = TokenBucket(rate, self.burst) if rate else None
+            self._subnets: Dict[str, TokenBucket] = {}
+            self.sent = 0
+            self.first = None
+            self.last = None
+            self._cancelled.clear()
+
+    @property
+    def enabled(self) -> bool:
+        return self._global is not None or self.per_subnet is not None
+
+    def reserve(self, ip: Optional[str] = None) -> float:
+        """Takes a token for one probe to `ip` (None = not aimed at a target subnet, e.g. DNS).
+        Returns the seconds to wait before sending it."""
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            delay = self._global.reserve(now) if self._global is not None else 0.0
+            if self.per_subnet and ip is not None:
+                subnet = subnet_of(ip)
+                bucket = self._subnets.get(subnet)
+                if bucket is None:
+                    bucket = self._subnets[subnet] = TokenBucket(self.per_subnet, self.per_subnet / 10)
+                delay = max(delay, bucket.reserve(now))
+            send_at = now + delay
+            self.sent += 1
+            if self.first is None:
+                self.first = send_at
+            self.last = max(self.last or send_at, send_at)
+        return delay
+
+    def pace(self, ip: Optional[str] = None):
+        delay = self.reserve(ip)
+        if delay > 0 and self._cancelled.wait(delay):
+            raise ScanCancelled()
+
+    def cancel(self):
+        # wakes everybody sleeping in pace(), see ProbeBudget.cancel
+        self._cancelled.set()
+
+    def totals(self) -> tuple:
+        with self._lock:
+            return self.sent, self.first, self.last
+
+    def merge(self, totals: tuple):
+        # counts from a --processes worker, monotonic clocks are system wide so the stamps compare
+        sent, first, last = totals
+        if not sent:
+            return
+        with self._lock:
+            self.sent += sent
+            self.first = first if self.first is None else min(self.first, first)
+            self.last = last if self.last is None else max(self.last, last)
+
+    def achieved(self) -> Optional[float]:
+        with self._lock:
+            if self.sent < 2 or self.last <= self.first:
+                return None
+            return (self.sent - 1) / (self.last - self.first)
+
+
+RATE = RateLimiter()
+
+
+if __name__ == "__main__": # Testing, 4 threads sharing 200/s for ~1s
+    RATE.configure(200, burst=1)
+    start = time.monotonic()
+
+    def worker():
+        for _ in range(50):
+            RATE.pace("10.0.0.1")
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"{RATE.sent} probes in {time.monotonic() - start:.2f}s, achieved {RATE.achieved():.1f}/s")
@@ -0,0 +1,127 @@
+from typing import Dict, List, Optional, Sequence, TextIO, Tuple
+from CLIhelpers import CSI, truncate, format_loading_bar
+from stageTimer import PROFILER
+import CLIhelpers
+import threading
+import sys
+import time
+
+# Terminal output for the scan. Rows use a layout worked out once per column set, cells
+# are padded by the length of their plain text (no ANSI stripping per cell), and finished
+# rows + the progress bar go out as one write per frame instead of a print and a flush
+# per host.
+
+FRAME_INTERVAL = 0.1   # seconds, ~10 redraws per second
+_CLEAR_LINE = f"\r{CSI}2K"
+
+
+class RowLayout:
+    """Column layout for one set of fields, reused for every row."""
+
+    def __init__(self, fields: Sequence, ip_width: int, plain: bool = False):
+        self.ip_width = ip_width
+        self.plain = plain
+        # "name: " prefixes are built once here instead of per row
+        self.columns = [(field, f"{field.name}: ") for field in fields]
+
+    def _cell(self, field, value) -> Tuple[str, str]:
+        if field.key == "ping_ms" and value and value != "[N/D]" and value != "[err]":
+            try:
+                value = int(value)
+            except (ValueError, TypeError):
+                value = None
+
+        colored, plain = field.format_func(value)
+        if len(plain) > field.width:
+            plain = truncate(plain, field.width)
+            colored, plain = field.format_func(plain if plain != "[N/D]" and plain != "[err]" else None)
+
+        padding = ' ' * (field.width - len(plain)) if len(plain) < field.width else ''
+        return colored + padding, plain + padding
+
+    def render(self, ip: str, status: str, result_data: dict) -> Tuple[str, int]:
+        ip_cell = ip.ljust(self.ip_width)
+        if self.plain:
+            parts = [f"{status} {ip_cell}"]
+            for field, prefix in self.columns:
+                parts.append(prefix + self._cell(field, result_data.get(field.key))[1])
+            line = " | ".join(parts)
+            return line, len(line)
+
+        parts = [f"{status} {ip_cell}"]
+        plain_length = 3 + len(ip_cell)   # "■  <ip>" 
+        for field, prefix in self.columns:
+            colored, plain = self._cell(field, result_data.get(field.key))
+            parts.append(prefix + colored)
+            plain_length += 3 + len(prefix) + len(plain)
+        return " | ".join(parts), plain_length
+
+
+_layouts: Dict[tuple, RowLayout] = {}
+_layouts_lock = threading.Lock()
+
+
+def layout_for(fields: Sequence, ip_width: int) -> RowLayout:
+    key = (tuple(field.key for field in fields), ip_width, CLIhelpers.plain_mode)
+    layout = _layouts.get(key)
+    if layout is None:
+        with _layouts_lock:
+            layout = _layouts.setdefault(key, RowLayout(fields, ip_width, CLIhelpers.plain_mode))
+    return layout
+
+
+class Renderer:
+    """Buffers result rows and redraws the progress bar at most once per frame."""
+
+    def __init__(self, total: int, stream: Optional[TextIO] = None, short_terminal: bool = False,
+                 frame_interval: float = FRAME_INTERVAL):
+        self.total = total
+        self.stream = stream or sys.stdout
+        self.plain = CLIhelpers.plain_mode
+        self.short_terminal = short_terminal
+        self.frame_interval = frame_interval
+        self.separator_length = 0
+        self._rows: List[str] = []
+        self._value = 0
+        self._msg = ""
+        self._last_frame = 0.0
+
+    def _format(self, line: str) -> str:
+        if self.short_terminal:
+            splitted = line.split(" | ")
+            out = [splitted[0].replace("-", "")]
+            out.extend(part for part in splitted if len(part) < 150)
+            return "\n".join(out) + "\n\n\n"
+        return line
+
+    def row(self, line: str, plain_length: int):
+        self.separator_length = plain_length
+        self._rows.append(self._format(f"{'-' * plain_length}\n{line}"))
+
+    def progress(self, value: int, msg: str = ""):
+        self._value = value
+        self._msg = msg
+        if time.monotonic() - self._last_frame >= self.frame_interval:
+            self.flush()
+
+    @PROFILER.timed('print')
+    def flush(self):
+        self._last_frame = time.monotonic()
+        out = []
+        if self.plain:
+            out.extend(row + "\n" for row in self._rows)
+        else:
+            out.append(_CLEAR_LINE)
+            out.extend(row + "\n" for row in self._rows)
+            if self.total > 0:
+                out.append(format_loading_bar(self._value, self.total, self._msg))
+        self._rows.clear()
+        self.stream.write("".join(out))
+        self.stream.flush()
+
+    def close(self):
+        # last frame always shows the final count, then move off the bar line
+        self.flush()
+        if not self.plain:
+            self.stream.write("\n")
+            self.stream.flush()
@@ -0,0 +1,79 @@
+from typing import Dict, List, Optional
+from probeBudget import subnet_of
+import threading
+
+# Connect timeouts from measured round trips instead of a flat 0.6s: every echo RTT
+# feeds a smoothed RTT + variance per /24 (RFC 6298 style), and a host's timeout is
+# its own RTT plus 4x the subnet's variance, clamped to [floor, ceiling]. On a LAN a
+# dead port then costs ~floor, across a slow WAN link it gets the time it needs.
+
+ALPHA = 1 / 8
+BETA = 1 / 4
+K = 4
+GRANULARITY = 0.01   # seconds, lower bound for the variance term
+
+DEFAULT_FLOOR = 0.1
+DEFAULT_CEILING = 3.0
+FIXED_PORT_TIMEOUT = 0.6
+
+
+class RTTEstimator:
+    def __init__(self, floor: float = DEFAULT_FLOOR, ceiling: float = DEFAULT_CEILING, enabled: bool = True):
+        self._lock = threading.Lock()
+        self._subnets: Dict[str, List[float]] = {}   # /24 -> [srtt, rttvar] in seconds
+        self.configure(floor, ceiling, enabled)
+
+    def configure(self, floor: Optional[float] = None, ceiling: Optional[float] = None, enabled: bool = True):
+        self.floor = floor if floor and floor > 0 else DEFAULT_FLOOR
+        self.ceiling = max(self.floor, ceiling if ceiling and ceiling > 0 else DEFAULT_CEILING)
+        self.enabled = enabled
+
+    @property
+    def retries(self) -> int:
+        # short adaptive timeouts can lose to a dropped SYN, so timed out ports get one more try
+        return 1 if self.enabled else 0
+
+    def observe(self, ip: str, rtt_ms: Optional[float]):
+        if rtt_ms is None or rtt_ms < 0:
+            return
+        rtt = rtt_ms / 1000
+        subnet = subnet_of(ip)
+        with self._lock:
+            stats = self._subnets.get(subnet)
+            if stats is None:
+                self._subnets[subnet] = [rtt, rtt / 2]
+            else:
+                srtt, rttvar = stats
+                stats[1] = (1 - BETA) * rttvar + BETA * abs(srtt - rtt)
+                stats[0] = (1 - ALPHA) * srtt + ALPHA * rtt
+
+    def subnet_stats(self, ip: str) -> Optional[tuple]:
+        with self._lock:
+            stats = self._subnets.get(subnet_of(ip))
+            return tuple(stats) if stats else None
+
+    def port_timeout(self, ip: str, rtt_ms: Optional[float] = None) -> float:
+        if not self.enabled:
+            return FIXED_PORT_TIMEOUT
+
+        stats = self.subnet_stats(ip)
+        if rtt_ms is None and stats is None:
+            return min(self.ceiling, max(self.floor, FIXED_PORT_TIMEOUT))
+
+        base = rtt_ms / 1000 if rtt_ms is not None else stats[0]
+        rttvar = stats[1] if stats else base / 2
+        return min(self.ceiling, max(self.floor, base + max(GRANULARITY, K * rttvar)))
+
+
+RTT = RTTEstimator()
+
+
+if __name__ == "__main__": # Testing
+    est = RTTEstimator()
+    for sample in (0.4, 0.5, 0.3, 0.6, 0.45):
+        est.observe("192.168.1.10", sample)
+    for sample in (180, 220, 150, 400, 210):
+        est.observe("10.20.30.40", sample)
+    print("LAN host:", est.port_timeout("192.168.1.20", 0.5))
+    print("WAN host:", est.port_timeout("10.20.30.41", 200))
+    print("unknown subnet, no rtt:", est.port_timeout("172.16.0.1"))
@@ -0,0 +1,161 @@
+from typing import Callable, Dict, Optional, Tuple
+import threading
+import sqlite3
+import time
+
+# On-disk cache of slow-changing host facts (hostname, MAC, vendor, OS) keyed by IP,
+# so rescans every few minutes only pay for liveness and ports. Every field has its
+# own TTL; a different MAC on an IP means a different device, so everything else we
+# know about that IP gets dropped.
+
+DEFAULT_PATH = "scan_cache.sqlite"
+
+DEFAULT_TTLS = {
+    'hostname': 3600,
+    'mac': 600,
+    'vendor': 7 * 86400,
+    'os': 3600,
+}
+CACHED_FIELDS = tuple(DEFAULT_TTLS)
+MAC_DEPENDENT = ('hostname', 'vendor', 'os')
+
+_UNCACHEABLE = {None, '[N/D]', '[err]', '[invalid ip]', '[Disabled]'}
+
+
+def _is_real_mac(value: Optional[str]) -> bool:
+    return bool(value) and len(value) == 17
+
+
+class ScanCache:
+    def __init__(self, path: str = DEFAULT_PATH, ttls: Optional[Dict[str, float]] = None,
+                 commit_interval: float = 2.0):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.commit_interval = commit_interval
+        self.hits = 0
+        self.misses = 0
+
+        self._closed = False
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS facts ("
+            " ip TEXT NOT NULL, field TEXT NOT NULL, value TEXT, updated REAL NOT NULL,"
+            " PRIMARY KEY (ip, field)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+        self._last_commit = time.monotonic()
+
+    def _maybe_commit(self):
+        now = time.monotonic()
+        if now - self._last_commit >= self.commit_interval:
+            self._conn.commit()
+            self._last_commit = now
+
+    def lookup(self, ip: str) -> Dict[str, str]:
+        """Fields of `ip` that are still within their TTL."""
+        now = time.time()
+        with self._lock:
+            if self._closed:
+                return {}
+            rows = self._conn.execute("SELECT field, value, updated FROM facts WHERE ip = ?", (ip,)).fetchall()
+            fresh = {field: value for field, value, updated in rows
+                     if field in self.ttls and now - updated < self.ttls[field]}
+            self.hits += len(fresh)
+            self.misses += len(CACHED_FIELDS) - len(fresh)
+        return fresh
+
+    def note_mac(self, ip: str, mac: Optional[str]) -> bool:
+        """Records a freshly seen MAC. True (and dependents dropped) if the device behind `ip` changed."""
+        if not _is_real_mac(mac):
+            return False
+        with self._lock:
+            if self._closed:
+                return False
+            row = self._conn.execute("SELECT value FROM facts WHERE ip = ? AND field = 'mac'", (ip,)).fetchone()
+            if row is None or not _is_real_mac(row[0]) or row[0] == mac:
+                return False
+            self._conn.execute(
+                f"DELETE FROM facts WHERE ip = ? AND field IN ({','.join('?' * len(MAC_DEPENDENT))})",
+                (ip, *MAC_DEPENDENT)
+            )
+            self._conn.execute("REPLACE INTO facts VALUES (?, 'mac', ?, ?)", (ip, mac, time.time()))
+            self._maybe_commit()
+        return True
+
+    def store(self, ip: str, facts: Dict[str, Optional[str]]):
+        now = time.time()
+        rows = [(ip, field, value, now) for field, value in facts.items()
+                if field in self.ttls and value not in _UNCACHEABLE]
+        if not rows:
+            return
+        with self._lock:
+            if self._closed:
+                return
+            self._conn.executemany("REPLACE INTO facts VALUES (?, ?, ?, ?)", rows)
+            self._maybe_commit()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._conn.commit()
+            self._conn.close()
+
+
+CACHE: Optional[ScanCache] = None
+
+
+def open_cache(path: str = DEFAULT_PATH, ttls: Optional[Dict[str, float]] = None) -> ScanCache:
+    global CACHE
+    CACHE = ScanCache(path, ttls)
+    return CACHE
+
+
+def close_cache():
+    global CACHE
+    cache, CACHE = CACHE, None
+    if cache is not None:
+        cache.close()
+
+
+def load_facts(ip: str, fetch_mac: Callable[[str], Optional[str]]) -> Tuple[Dict[str, str], Optional[str]]:
+    """(fresh cached facts, MAC fetched just now or None) for a live host."""
+    if CACHE is None:
+        return {}, None
+    facts = CACHE.lookup(ip)
+    if 'mac' in facts:
+        return facts, None
+    # MAC expired: look again before trusting anything else, a swapped device must not
+    # inherit the old one's hostname/vendor/OS
+    mac = fetch_mac(ip)
+    if CACHE.note_mac(ip, mac):
+        facts = {}
+    return facts, mac
+
+
+def remember(ip: str, result_data: dict, cached: Dict[str, str]):
+    # only what was actually fetched this time, cached values keep their original timestamp
+    if CACHE is None or result_data.get('status') not in ('alive', 'host', 'filtered'):
+        return
+    CACHE.store(ip, {key: result_data.get(key) for key in CACHED_FIELDS if key not in cached})
+
+
+def parse_ttls(spec: str) -> Dict[str, float]:
+    # "hostname=3600,mac=300" -> {'hostname': 3600.0, 'mac': 300.0}
+    ttls = {}
+    for part in spec.split(','):
+        if '=' not in part:
+            continue
+        field, value = [x.strip() for x in part.split('=', 1)]
+        if field in DEFAULT_TTLS:
+            try:
+                ttls[field] = float(value)
+            except ValueError:
+                pass
+    return ttls
@@ -0,0 +1,214 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import argparse
+import sqlite3
+import json
+import time
+import re
+
+# --export-sqlite: every run appends to one history database instead of another CSV.
+# One row per scan in `scans`, one row per host and scan in `hosts` (a column for each
+# configured field, added as fields show up), and open ports split out into `open_ports`
+# so "who had 3389 open last month" is an index lookup instead of a LIKE over strings.
+# Rows are inserted in batched transactions on a WAL database, so readers (the query
+# CLI below, a dashboard...) can work on it while a scan is writing.
+
+BATCH_ROWS = 500
+BATCH_INTERVAL = 2.0   # seconds
+
+_COLUMN = re.compile(r'^[a-z_][a-z0-9_]*$')
+_EMPTY = {None, '', '[N/D]'}
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS scans ("
+    " id INTEGER PRIMARY KEY, started REAL NOT NULL, finished REAL, state TEXT NOT NULL,"
+    " command TEXT, fields TEXT, hosts INTEGER NOT NULL DEFAULT 0)",
+    "CREATE TABLE IF NOT EXISTS hosts ("
+    " scan_id INTEGER NOT NULL REFERENCES scans(id), ip TEXT NOT NULL, status TEXT NOT NULL,"
+    " PRIMARY KEY (scan_id, ip))",
+    "CREATE TABLE IF NOT EXISTS open_ports ("
+    " scan_id INTEGER NOT NULL REFERENCES scans(id), ip TEXT NOT NULL, port INTEGER NOT NULL,"
+    " PRIMARY KEY (scan_id, ip, port)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS hosts_ip ON hosts (ip, scan_id)",
+    "CREATE INDEX IF NOT EXISTS open_ports_port ON open_ports (port, scan_id)",
+    "CREATE INDEX IF NOT EXISTS open_ports_ip ON open_ports (ip, scan_id)",
+)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for statement in _SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    return conn
+
+
+def _host_columns(conn: sqlite3.Connection) -> List[str]:
+    return [row[1] for row in conn.execute("PRAGMA table_info(hosts)")]
+
+
+def _parse_ports(value) -> List[int]:
+    if value in _EMPTY:
+        return []
+    return [int(part) for part in str(value).split(',') if part.strip().isdigit()]
+
+
+class SQLiteSink:
+    # same interface as the CSV/NDJSON sinks: write() per finished host, close() at the end
+    def __init__(self, path: str, fieldnames: List[str], command: str = ""):
+        self.path = path
+        self.count = 0
+        self.interrupted = False
+        self._conn = connect(path)
+
+        # the schema follows FieldManager: one column per field key, open ports get their own table
+        self.columns = [key for key in fieldnames if key not in ('ip', 'status', 'open_ports') and _COLUMN.match(key)]
+        self._ports = 'open_ports' in fieldnames
+        existing = set(_host_columns(self._conn))
+        for key in self.columns:
+            if key not in existing:
+                self._conn.execute(f'ALTER TABLE hosts ADD COLUMN "{key}"')
+        if 'mac' in self.columns:
+            self._conn.execute("CREATE INDEX IF NOT EXISTS hosts_mac ON hosts (mac, scan_id)")
+
+        self.scan_id = self._conn.execute(
+            "INSERT INTO scans (started, state, command, fields) VALUES (?, 'running', ?, ?)",
+            (time.time(), command, json.dumps(fieldnames))
+        ).lastrowid
+        self._conn.commit()
+
+        names = ', '.join(['scan_id', 'ip', 'status'] + [f'"{key}"' for key in self.columns])
+        self._insert_host = f"REPLACE INTO hosts ({names}) VALUES ({', '.join('?' * (len(self.columns) + 3))})"
+        self._hosts: List[tuple] = []
+        self._open_ports: List[Tuple[int, str, int]] = []
+        self._last_commit = time.monotonic()
+
+    def write(self, result: dict):
+        ip = result['ip']
+        values = [None if result.get(key) in _EMPTY else result.get(key) for key in self.columns]
+        self._hosts.append((self.scan_id, ip, result.get('status'), *values))
+        if self._ports:
+            self._open_ports.extend((self.scan_id, ip, port) for port in _parse_ports(result.get('open_ports')))
+        self.count += 1
+        if len(self._hosts) >= BATCH_ROWS or time.monotonic() - self._last_commit >= BATCH_INTERVAL:
+            self._commit()
+
+    def _commit(self):
+        with self._conn:
+            self._conn.executemany(self._insert_host, self._hosts)
+            self._conn.executemany("INSERT OR IGNORE INTO open_ports VALUES (?, ?, ?)", self._open_ports)
+        self._hosts.clear()
+        self._open_ports.clear()
+        self._last_commit = time.monotonic()
+
+    def close(self):
+        if self._conn is None:
+            return
+        self._commit()
+        with self._conn:
+            self._conn.execute("UPDATE scans SET finished = ?, state = ?, hosts = ? WHERE id = ?",
+                               (time.time(), 'interrupted' if self.interrupted else 'done', self.count, self.scan_id))
+        self._conn.close()
+        self._conn = None
+
+
+# ---- queries ---------------------------------------------------------------------------
+
+def _since(days: Optional[float]) -> float:
+    return time.time() - days * 86400 if days else 0.0
+
+
+def _latest_hosts(conn: sqlite3.Connection, rows: Sequence[Tuple[str, int]]) -> Dict[str, dict]:
+    # the host row from the last scan each IP was seen in, for MAC/hostname next to the hits
+    out = {}
+    for ip, scan_id in rows:
+        cursor = conn.execute("SELECT * FROM hosts WHERE scan_id = ? AND ip = ?", (scan_id, ip))
+        row = cursor.fetchone()
+        if row is not None:
+            out[ip] = dict(zip([c[0] for c in cursor.description], row))
+    return out
+
+
+def hosts_with_port(conn: sqlite3.Connection, port: int, days: Optional[float] = None) -> List[dict]:
+    rows = conn.execute(
+        "SELECT p.ip, MAX(p.scan_id), COUNT(*), MAX(s.started) FROM open_ports p"
+        " JOIN scans s ON s.id = p.scan_id"
+        " WHERE p.port = ? AND s.started >= ? GROUP BY p.ip ORDER BY MAX(s.started) DESC",
+        (port, _since(days))
+    ).fetchall()
+    latest = _latest_hosts(conn, [(ip, scan_id) for ip, scan_id, _, _ in rows])
+    return [dict(latest.get(ip, {}), ip=ip, scans=count, last_seen=last_seen)
+            for ip, _, count, last_seen in rows]
+
+
+def host_history(conn: sqlite3.Connection, column: str, value: str, days: Optional[float] = None) -> List[dict]:
+    # every scan an IP (or MAC) showed up in, with the ports it had open then
+    if column not in _host_columns(conn):
+        return []
+    cursor = conn.execute(
+        f'SELECT s.started, h.* FROM hosts h JOIN scans s ON s.id = h.scan_id'
+        f' WHERE h."{column}" = ? AND s.started >= ? ORDER BY s.started DESC',
+        (value, _since(days))
+    )
+    names = ['started'] + [c[0] for c in cursor.description[1:]]
+    out = []
+    for row in cursor.fetchall():
+        record = dict(zip(names, row))
+        ports = conn.execute("SELECT port FROM open_ports WHERE scan_id = ? AND ip = ? ORDER BY port",
+                             (record['scan_id'], record['ip'])).fetchall()
+        record['open_ports'] = ','.join(str(p[0]) for p in ports)
+        out.append(record)
+    return out
+
+
+def list_scans(conn: sqlite3.Connection, days: Optional[float] = None) -> List[dict]:
+    cursor = conn.execute("SELECT * FROM scans WHERE started >= ? ORDER BY id DESC", (_since(days),))
+    return [dict(zip([c[0] for c in cursor.description], row)) for row in cursor.fetchall()]
+
+
+def _print_rows(rows: List[dict], columns: Sequence[str]):
+    if not rows:
+        print("(no matches)")
+        return
+    shown = []
+    for row in rows:
+        cells = []
+        for key in columns:
+            value = row.get(key)
+            if key in ('started', 'finished', 'last_seen') and value:
+                value = time.strftime('%Y-%m-%d %H:%M', time.localtime(value))
+            cells.append('' if value is None else str(value))
+        shown.append(cells)
+    widths = [max(len(key), *(len(cells[i]) for cells in shown)) for i, key in enumerate(columns)]
+    print('  '.join(key.ljust(w) for key, w in zip(columns, widths)))
+    for cells in shown:
+        print('  '.join(cell.ljust(w) for cell, w in zip(cells, widths)))
+
+
+if __name__ == "__main__":
+    # python scanHistory.py history.sqlite port 3389 --days 30
+    ap = argparse.ArgumentParser(description='Query a --export-sqlite scan history')
+    ap.add_argument('db', help='Database written by scanner.py --export-sqlite')
+    ap.add_argument('--days', type=float, default=None, help='Only look at scans from the last N days')
+    sub = ap.add_subparsers(dest='query', required=True)
+    sub.add_parser('scans', help='List recorded scans')
+    port_ap = sub.add_parser('port', help='Hosts that had PORT open')
+    port_ap.add_argument('port', type=int)
+    ip_ap = sub.add_parser('ip', help='History of one IP')
+    ip_ap.add_argument('ip')
+    mac_ap = sub.add_parser('mac', help='History of one MAC address')
+    mac_ap.add_argument('mac')
+    args = ap.parse_args()
+
+    conn = connect(args.db)
+    extra = [c for c in ('mac', 'hostname', 'vendor') if c in _host_columns(conn)]
+    if args.query == 'scans':
+        _print_rows(list_scans(conn, args.days), ['id', 'started', 'finished', 'state', 'hosts', 'command'])
+    elif args.query == 'port':
+        _print_rows(hosts_with_port(conn, args.port, args.days), ['ip', 'scans', 'last_seen'] + extra)
+    else:
+        column, value = ('ip', args.ip) if args.query == 'ip' else ('mac', args.mac.replace('-', ':').upper())
+        _print_rows(host_history(conn, column, value, args.days),
+                    ['started', 'scan_id', 'ip', 'status', 'open_ports'] + [c for c in extra if c != column])
+    conn.close()
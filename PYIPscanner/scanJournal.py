@@ -0,0 +1,99 @@
+from typing import Dict, Optional, Tuple
+import threading
+import json
+import time
+import os
+
+# --journal / --resume: every finished target is appended to a journal (one JSON object
+# per line, first line is a header) the moment it completes, so a scan that got
+# interrupted or killed can skip whatever it already did. Writes are buffered and
+# flushed every FLUSH_LINES lines or FLUSH_INTERVAL seconds, with an fsync at most every
+# FSYNC_INTERVAL. A torn last line from a crash is skipped on load.
+
+VERSION = 1
+FLUSH_LINES = 256
+FLUSH_INTERVAL = 1.0
+FSYNC_INTERVAL = 5.0
+
+
+class ScanJournal:
+    def __init__(self, path: str, header: dict):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._flushed = self._synced = time.monotonic()
+
+        fresh = not os.path.exists(path) or os.path.getsize(path) == 0
+        torn = False
+        if not fresh:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+        self._file = open(path, 'a', encoding='utf-8')
+        if torn:
+            self._file.write('\n')  # don't glue our first record onto a half-written line
+        if fresh:
+            self._file.write(json.dumps(dict(header, journal=VERSION)) + '\n')
+            self._flush(time.monotonic(), sync=True)
+
+    def record(self, result_data: dict):
+        line = json.dumps(result_data, separators=(',', ':'), default=str)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line + '\n')
+            self.count += 1
+            self._pending += 1
+            now = time.monotonic()
+            if self._pending >= FLUSH_LINES or now - self._flushed >= FLUSH_INTERVAL:
+                self._flush(now)
+
+    def _flush(self, now: float, sync: bool = False):
+        self._file.flush()
+        self._pending = 0
+        self._flushed = now
+        if sync or now - self._synced >= FSYNC_INTERVAL:
+            os.fsync(self._file.fileno())
+            self._synced = now
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush(time.monotonic(), sync=True)
+            self._file.close()
+
+
+def load_journal(path: str) -> Tuple[dict, Dict[str, dict]]:
+    """(header, {ip: result_data}) of a journal, later records win over earlier ones."""
+    header: Optional[dict] = None
+    done: Dict[str, dict] = {}
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(record, dict):
+                continue
+            if header is None and 'journal' in record:
+                header = record
+            elif record.get('ip'):
+                done[record['ip']] = record
+    return header or {}, done
+
+
+if __name__ == "__main__": # Testing
+    import tempfile
+    path = os.path.join(tempfile.mkdtemp(), 'scan.journal')
+    journal = ScanJournal(path, {'fields': ['ip', 'status']})
+    for i in range(3):
+        journal.record({'ip': f"10.0.0.{i}", 'status': 'alive'})
+    journal.close()
+    with open(path, 'a') as f:
+        f.write('{"ip": "10.0.0.9", "sta')  # crash mid-write
+    journal = ScanJournal(path, {})
+    journal.record({'ip': '10.0.0.3', 'status': 'dead'})
+    journal.close()
+    print(load_journal(path))
@@ -1,15 +1,33 @@
 from MAClookup import get_vendor_from_mac_address_no_this_is_not_made_by_chatgpt_trust_me, preload_database
-from typing import List, Optional, Tuple, Callable
+from typing import Iterable, List, Optional, Tuple, Callable
 from WOL import make_wol_link, WOLButtonServer
-from CLIhelpers import pass_st_var
+from CLIhelpers import pass_st_var, set_plain_mode
+from renderer import Renderer, layout_for
+from pipeline import stream_staged, ReorderBuffer
+from asyncEngine import run_async_scan
+from neighborTable import NEIGHBORS
+from dnsResolver import RESOLVER
+from rttEstimator import RTT
+from portStats import PORT_STATS
+from rateLimiter import RATE, parse_rate
+from stageTimer import PROFILER
+from diffScan import load_snapshot, plan_diff
+from scanJournal import ScanJournal, load_journal
+from scanHistory import SQLiteSink
+from shardScan import ShardedScan
+from distributed import Coordinator, run_worker, parse_address, is_loopback
+from probeBudget import BUDGET, fd_limit
+import scanCache
 from dataclasses import dataclass
 import concurrent.futures
 from fileHelpers import *
 from netTools import *
 import threading
 import argparse
+import sqlite3
 import time
-import csv
+import os
+import sys
 
 
 
@@ -116,6 +134,8 @@ class FieldManager:
         plain = display
         if display == "[N/D]":
             colored = f"{CSI}1;31m{display}{RESET}"
+        elif display == FILTERED:
+            colored = f"{CSI}1;93m{display}{RESET}"
         else:
             colored = f"{CSI}1;34m{display}{RESET}"
         return colored, plain
@@ -202,6 +222,9 @@ class FieldManager:
 
 
 
+HOSTNAME_TIMEOUT = 1.5
+
+
 def scan_ip_return(ip: str,
                    field_manager: FieldManager,
                    ports: Optional[List[int]] = None,
@@ -210,47 +233,108 @@ def scan_ip_return(ip: str,
     if not is_valid_ip(ip):
         return _handle_invalid_ip(ip, field_manager, ip_width, skip_ports)
 
-    alive = is_alive(ip)
+    return enrich_host(ip, probe_host(ip), field_manager, ports, ip_width, skip_ports)
+
+
+def _fetch_field(field: FieldConfig, ip: str, alive: bool):
+    try:
+        value = field.fetch_func(ip, alive)
+    except Exception:
+        value = None
+    return value if value is not None else field.default_value
+
+
+def enrich_host(ip: str,
+                probe: HostProbe,
+                field_manager: FieldManager,
+                ports: Optional[List[int]] = None,
+                ip_width: int = 15,
+                skip_ports: bool = False,
+                field_executor: Optional[concurrent.futures.Executor] = None) -> Tuple[str, str, int, dict]:
+    # With a field_executor the independent fields (hostname, MAC, custom fetch_funcs) run
+    # next to the port scan instead of one after another.
+    alive = probe.alive
 
     result_data = {
         'ip': ip,
         'status': 'dead'
     }
 
+    cached = {}
+    if alive and scanCache.CACHE is not None:
+        with PROFILER.stage('cache'):
+            cached, fresh_mac = scanCache.load_facts(ip, get_mac_address)
+        result_data.update(cached)
+        if 'mac' not in cached:
+            result_data['mac'] = fresh_mac or "[N/D]"
+
     active_fields = field_manager.get_active_fields(skip_ports)
+    pending = {}
+    submitted = time.perf_counter()
+    port_field = None
 
     for field in active_fields:
-        if field.key == "vendor":
+        if field.key == "vendor" or field.key in result_data:
             continue
 
         if field.key == "open_ports":
             if not skip_ports and alive:
-                open_ports = get_open_ports(ip, ports or DEFAULT_PORTS, timeout=0.6,
-                                            max_workers=min(100, (len(ports) if ports else len(DEFAULT_PORTS))))
-                result_data[field.key] = ','.join(map(str, open_ports)) if open_ports else field.default_value
+                port_field = field
             else:
                 result_data[field.key] = field.default_value
 
         elif field.key == "os":
             if alive:
-                ttl = get_ttl(ip)
+                ttl = probe.ttl
                 os_guess = detect_os_from_ttl(ttl) if ttl else None
                 result_data[field.key] = os_guess or field.default_value
             else:
                 result_data[field.key] = field.default_value
 
+        elif field.key == "ping_ms" and probe.rtt_ms is not None:
+            # same echo that proved the host alive, no need to ping again
+            result_data[field.key] = probe.rtt_ms
+
         elif field.fetch_func:
             if not field.requires_alive or alive:
-                try:
-                    value = field.fetch_func(ip, alive)
-                    result_data[field.key] = value if value is not None else field.default_value
-                except Exception:
-                    result_data[field.key] = field.default_value
+                if field_executor is None:
+                    result_data[field.key] = _fetch_field(field, ip, alive)
+                elif field.key == "hostname" and RESOLVER.available:
+                    # the resolver pipelines queries itself, no thread needed
+                    pending[field.key] = (field, RESOLVER.submit(ip), HOSTNAME_TIMEOUT)
+                else:
+                    pending[field.key] = (field, field_executor.submit(_fetch_field, field, ip, alive), None)
             else:
                 result_data[field.key] = field.default_value
         else:
             result_data[field.key] = field.default_value
 
+    if port_field is not None:
+        open_ports, filtered = scan_host_ports(ip, ports or DEFAULT_PORTS, timeout=RTT.port_timeout(ip, probe.rtt_ms),
+                                               max_workers=100, retries=RTT.retries, rtt_ms=probe.rtt_ms)
+        if open_ports:
+            result_data[port_field.key] = ','.join(map(str, open_ports))
+        else:
+            result_data[port_field.key] = FILTERED if filtered else port_field.default_value
+
+    for field, future, timeout in pending.values():
+        try:
+            value = future.result(timeout)
+        except Exception:
+            value = None
+        if timeout is not None:  # resolver future, nothing else times the lookup
+            PROFILER.record(field.key, time.perf_counter() - submitted)
+        result_data[field.key] = value if value is not None else field.default_value
+
+    outcome = _finalize_result(ip, alive, result_data, field_manager, ip_width, skip_ports)
+    scanCache.remember(ip, outcome[3], cached)
+    return outcome
+
+
+def _finalize_result(ip: str, alive: bool, result_data: dict, field_manager: FieldManager,
+                     ip_width: int, skip_ports: bool) -> Tuple[str, str, int, dict]:
+    active_fields = field_manager.get_active_fields(skip_ports)
+
     for field in active_fields:
         if field.key == "vendor":
             if alive:
@@ -262,9 +346,14 @@ def scan_ip_return(ip: str,
                 else:
                     result_data['wol'] = "[N/D]"
 
-                if mac and mac != "[N/D]" and mac != "[err]":
+                if vendor_disabled:
+                    result_data[field.key] = "[Disabled]"
+                elif result_data.get(field.key):
+                    pass  # from the scan cache
+                elif mac and mac != "[N/D]" and mac != "[err]":
                     try:
-                        vendor = get_vendor_from_mac_address_no_this_is_not_made_by_chatgpt_trust_me(mac) if not vendor_disabled else "[Disabled]"
+                        with PROFILER.stage('vendor'):
+                            vendor = get_vendor_from_mac_address_no_this_is_not_made_by_chatgpt_trust_me(mac)
                         if vendor and vendor.strip() and vendor != "Not found":
                             result_data[field.key] = vendor
                         else:
@@ -276,11 +365,14 @@ def scan_ip_return(ip: str,
             else:
                 result_data[field.key] = field.default_value
 
-    has_open_ports = not skip_ports and result_data.get('open_ports', '[N/D]') != '[N/D]'
+    has_open_ports = not skip_ports and result_data.get('open_ports', '[N/D]') not in ('[N/D]', FILTERED)
 
     if alive and has_open_ports:
         status = status_host()
         status_key = "host"
+    elif alive and result_data.get('open_ports') == FILTERED:
+        status = status_filtered()
+        status_key = "filtered"
     elif alive:
         status = status_alive()
         status_key = "alive"
@@ -313,57 +405,182 @@ def _handle_invalid_ip(ip: str, field_manager: FieldManager, ip_width: int, skip
     return "dead", line, plain_length, result_data
 
 
+@PROFILER.timed('render_line')
 def _build_output_line(ip: str, ip_width: int, status: str, result_data: dict, active_fields: List[FieldConfig],
                        field_manager: FieldManager) -> Tuple[str, int]:
-    parts = [f"{status} {ip.ljust(ip_width)}"]
-    plain_parts = [f"■  {ip.ljust(ip_width)}"]
+    return layout_for(active_fields, ip_width).render(ip, status, result_data)
+
+
+def export_to_csv(results: List[dict], filepath: str, field_manager: FieldManager,
+                  skip_ports: bool = False) -> bool:
+    # kept for callers that still collect results first, the scan itself streams through CSVSink
+    try:
+        sink = CSVSink(filepath, field_manager.get_csv_fieldnames(skip_ports))
+        try:
+            for result in results:
+                sink.write(result)
+        finally:
+            sink.close()
+        return True
+    except Exception as e:
+        print_error(f"Failed to export CSV: {e}")
+        return False
+
 
+def _run_thread_scan(ip_list: Iterable[str], field_manager: FieldManager, ports: Optional[List[int]],
+                     ip_width: int, skip_ports: bool, workers: int, window: int, discovery_workers: int):
+    # stage 1: liveness only, lots of cheap workers; dead hosts are finished right there
+    # stage 2: enrichment of live hosts on its own `workers` pool
+    def discover(ip: str):
+        if not is_valid_ip(ip):
+            return True, _handle_invalid_ip(ip, field_manager, ip_width, skip_ports)
+        probe = probe_host(ip)
+        if probe.alive:
+            return False, probe
+        return True, enrich_host(ip, probe, field_manager, ports, ip_width, skip_ports)
+
+    def enrich(ip: str, probe: HostProbe):
+        return enrich_host(ip, probe, field_manager, ports, ip_width, skip_ports, field_ex)
+
+    pools = [concurrent.futures.ThreadPoolExecutor(max_workers=discovery_workers),
+             concurrent.futures.ThreadPoolExecutor(max_workers=workers),
+             concurrent.futures.ThreadPoolExecutor(max_workers=min(64, workers))]
+    try:
+        # with the in-process sweeper, discovery pings a whole chunk per sweep as it goes
+        batch = SWEEP_CHUNK if uses_icmp_sweeper() else 0
+        discover_ex = PROFILER.wrap_executor(pools[0], 'discovery')
+        enrich_ex = PROFILER.wrap_executor(pools[1], 'enrich')
+        field_ex = PROFILER.wrap_executor(pools[2], 'field')
+        yield from stream_staged(discover_ex, enrich_ex, discover, enrich, ip_list,
+                                 discovery_workers * 2, window, batch, sweep_batch if batch else None)
+    finally:
+        # no waiting here: on Ctrl-C queued hosts are dropped and the running ones give up
+        # on their next probe once main() cancels BUDGET/RATE
+        for pool in pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _error_result(ip: str, error: Exception, field_manager: FieldManager, ip_width: int,
+                  skip_ports: bool) -> Tuple[str, str, int, dict]:
+    error_data = {
+        'ip': ip,
+        'status': 'error'
+    }
+    active_fields = field_manager.get_active_fields(skip_ports)
     for field in active_fields:
-        value = result_data.get(field.key)
+        error_data[field.key] = '[err]'
+
+    line, plain_length = _build_output_line(
+        ip, ip_width, status_dead(),
+        error_data, active_fields, field_manager
+    )
+    return "dead", f"{line} ({error})", plain_length, error_data
+
+
+def _worker_result(ip: str, result_data: dict, field_manager: FieldManager, ip_width: int,
+                   skip_ports: bool) -> Tuple[str, str, int, dict]:
+    # rows from --processes workers and --worker nodes are rendered here from their data,
+    # same as a local result
+    status_key = result_data.get('status')
+    if status_key == 'error':
+        return _error_result(ip, result_data.get('error', 'worker failed'), field_manager, ip_width, skip_ports)
+    status = {'host': status_host, 'alive': status_alive, 'filtered': status_filtered}.get(status_key)
+    if status is None:
+        # dead, error and invalid all show as dead, anything else a worker made up counts as dead
+        if status_key not in ('dead', 'error', 'invalid'):
+            result_data['status'] = 'dead'
+        status_key, status = 'dead', status_dead
+    line, plain_length = _build_output_line(ip, ip_width, status(), result_data,
+                                            field_manager.get_active_fields(skip_ports), field_manager)
+    return status_key, line, plain_length, result_data
 
-        if field.key == "ping_ms" and value and value != "[N/D]" and value != "[err]":
-            try:
-                value = int(value)
-            except (ValueError, TypeError):
-                value = None
 
-        colored, plain = field.format_func(value)
+def _gone_result(ip: str, previous_row: dict, field_manager: FieldManager, ip_width: int,
+                 skip_ports: bool) -> Tuple[str, str, int, dict]:
+    # host was up in the previous snapshot and didn't answer now, show what we knew about it
+    result_data = dict(previous_row, status='dead', change='gone')
+    active_fields = field_manager.get_active_fields(skip_ports)
+    for field in active_fields:
+        if field.key in ('open_ports', 'ping_ms', 'wol') or not result_data.get(field.key):
+            result_data[field.key] = field.default_value
 
-        if len(plain) > field.width:
-            plain = truncate(plain, field.width)
-            colored = truncate(plain, field.width)
-            colored, plain = field.format_func(plain if plain != "[N/D]" and plain != "[err]" else None)
+    line, plain_length = _build_output_line(ip, ip_width, status_dead(), result_data,
+                                            active_fields, field_manager)
+    return "dead", line, plain_length, result_data
 
-        plain_padded = plain.ljust(field.width)
-        colored_padded = pad_colored_text(colored, field.width)
 
-        parts.append(f"{field.name}: {colored_padded}")
-        plain_parts.append(f"{field.name}: {plain_padded}")
+def _discovery_workers(args) -> int:
+    return args.discovery_workers or min(1024, args.workers * 4)
 
-    line = " | ".join(parts)
-    plain_line = " | ".join(plain_parts)
-    plain_length = len(plain_line)
 
-    return line, plain_length
+def _configure_limits(args, rate: Optional[float], subnet_rate: Optional[float], shares: int = 1,
+                      subnet_shares: int = 1):
+    # shares: how many processes split the scan-wide limits, subnet_shares: how many can hit the same /24
+    max_inflight = max(1, args.max_inflight // shares) if args.max_inflight else None
+    per_subnet = max(1, args.per_subnet_inflight // subnet_shares) if args.per_subnet_inflight else None
+    BUDGET.configure(max_inflight, args.per_host_inflight, per_subnet)
+    RATE.configure(rate / shares if rate else None, subnet_rate / subnet_shares if subnet_rate else None,
+                   args.burst / shares if args.burst else None)
 
 
-def export_to_csv(results: List[dict], filepath: str, field_manager: FieldManager,
-                  skip_ports: bool = False) -> bool:
-    try:
-        fieldnames = field_manager.get_csv_fieldnames(skip_ports)
+def _start_engine(ip_list: Iterable[str], field_manager: FieldManager, ports: Optional[List[int]], ip_width: int,
+                  args):
+    if args.engine == 'async':
+        return run_async_scan(ip_list, field_manager, _finalize_result, ports or DEFAULT_PORTS,
+                              ip_width, args.skip_ports, args.workers)
+    return _run_thread_scan(ip_list, field_manager, ports, ip_width, args.skip_ports,
+                            args.workers, args.window or args.workers * 2, _discovery_workers(args))
 
-        with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
 
-            for result in results:
-                filtered = {k: v for k, v in result.items() if k in fieldnames}
-                writer.writerow(filtered)
+def _shard_worker(shard: TargetSet, config: dict, send: Callable) -> dict:
+    # body of a --processes/--worker worker: same settings as the parent, then a normal scan of
+    # `shard`. Only the result data goes back, the parent renders it with _worker_result.
+    global vendor_disabled
+    global short_terminal
+    args = config['args']
 
-        return True
-    except Exception as e:
-        print_error(f"Failed to export CSV: {e}")
-        return False
+    if args.plain:
+        set_plain_mode()
+    if args.short_terminal:
+        short_terminal = True
+        pass_st_var()
+    vendor_disabled = args.skip_vendor
+    if args.profile:
+        PROFILER.enable()
+
+    RTT.configure(args.timeout_floor, args.timeout_ceiling, not args.fixed_timeouts)
+    set_filtered_policy(args.filtered_hosts)
+    PORT_STATS.configure(not args.fixed_port_order, args.first_hit)
+    _configure_limits(args, config['rate'], config['subnet_rate'], config['shares'], config['subnet_shares'])
+    if args.cache:
+        try:
+            scanCache.open_cache(args.cache, scanCache.parse_ttls(args.cache_ttl) if args.cache_ttl else None)
+            PORT_STATS.load(args.cache)
+        except sqlite3.Error:
+            pass
+
+    if set_ping_method(args.ping_method) == 'icmp':
+        sweep_hosts(shard)
+    NEIGHBORS.refresh(force=True)
+
+    field_manager = FieldManager()
+    ip_width = config['ip_width']
+    try:
+        for idx, ip, outcome in _start_engine(shard, field_manager, config['ports'], ip_width, args):
+            if isinstance(outcome, Exception):
+                send(ip, {'ip': ip, 'status': 'error', 'error': str(outcome)})
+            else:
+                send(ip, outcome[3])
+    finally:
+        cache = scanCache.CACHE
+        scanCache.close_cache()
+        PORT_STATS.save()
+
+    return {
+        'rate': RATE.totals(),
+        'cache': (cache.hits, cache.misses) if cache is not None else None,
+        'profile': PROFILER.snapshot() if args.profile else None,
+    }
 
 
 def main():
@@ -371,48 +588,126 @@ def main():
     global short_terminal
 
     ap = argparse.ArgumentParser(description=NAME)
-    group = ap.add_mutually_exclusive_group(required=False)
-    group.add_argument('--range',
-                       help='Range: 192.168.0.1-192.168.0.255 or 192.168.0.1-255 (shorthand) or CIDR: 192.168.0.0/24',
-                       default=127)
-    group.add_argument('--ips', help='Comma separated IPs: 192.168.0.1,192.168.0.3')
-    group.add_argument('--file', help='File with IPs/ranges/CIDR (one per line), supports comments (#)')
+    # --range, --ips and --file can be combined, targets are merged and deduplicated
+    ap.add_argument('--range',
+                    help='Range: 192.168.0.1-192.168.0.255 or 192.168.0.1-255 (shorthand) or CIDR: 192.168.0.0/24',
+                    default=None)
+    ap.add_argument('--ips', help='Comma separated IPs: 192.168.0.1,192.168.0.3')
+    ap.add_argument('--file', help='File with IPs/ranges/CIDR (one per line), supports comments (#)')
     ap.add_argument('--ports', help='Comma separated ports (default common ports)', default=None)
     ap.add_argument('--port-range', help='Ports or ranges like 1-1000 or 1-100,200,300-310', default=None)
-    ap.add_argument('--workers', help='Max concurrent IP workers', type=int, default=200)
-    ap.add_argument('--ignore-types', help='Comma separated types to ignore: host,alive,dead', default=None)
+    ap.add_argument('--workers', help='Max concurrent IP workers (enrichment of live hosts)', type=int, default=200)
+    ap.add_argument('--discovery-workers', type=int, default=None,
+                    help='Max concurrent liveness checks (default: 4x workers, up to 1024)')
+    ap.add_argument('--window', type=int, default=None,
+                    help='Max IPs submitted but not finished at once (default: 2x workers)')
+    ap.add_argument('--sorted', action='store_true',
+                    help='Print/export results in IP order instead of as they complete')
+    ap.add_argument('--engine', choices=['thread', 'async'], default='thread',
+                    help='Scan engine: thread (thread pool) or async (single asyncio event loop)')
+    ap.add_argument('--processes', type=int, default=1,
+                    help='Worker processes, each scanning its own shard of the targets with its own engine (default: 1)')
+    ap.add_argument('--shard-mode', choices=['interleave', 'blocks'], default='interleave',
+                    help='How --processes splits targets: /24 blocks dealt round-robin, or contiguous runs of them')
+    ap.add_argument('--coordinator', default=None, metavar='[HOST:]PORT',
+                    help='Hand the scan out to --worker nodes in /24 work units and merge their results here '
+                         '(binds to 127.0.0.1 unless HOST is given, other addresses need --token)')
+    ap.add_argument('--local-workers', type=int, default=0,
+                    help='Start this many --worker processes on this machine (with --coordinator)')
+    ap.add_argument('--worker', default=None, metavar='HOST:PORT',
+                    help='Run as a worker node for the coordinator at HOST:PORT, scan settings come from it')
+    ap.add_argument('--token', default=None,
+                    help='Shared secret between coordinator and workers (or set PYIPSCANNER_TOKEN)')
+    ap.add_argument('--filtered-hosts', choices=['reduced', 'stop', 'full'], default='reduced',
+                    help='Hosts whose sentinel ports all time out: scan the rest with short timeouts (reduced), '
+                         'skip the rest (stop) or scan everything normally (full)')
+    ap.add_argument('--first-hit', action='store_true',
+                    help='Stop scanning a host at its first open port (enough to tell host from alive)')
+    ap.add_argument('--fixed-port-order', action='store_true',
+                    help="Probe ports in the given order instead of most-often-open first")
+    ap.add_argument('--ping-method', choices=['auto', 'icmp', 'system'], default='auto',
+                    help='Host probing: in-process ICMP sweep (icmp), system ping command (system) or auto')
+    ap.add_argument('--max-inflight', type=int, default=None,
+                    help='Max concurrent probes (ping, connect, DNS, ARP) for the whole scan (default: from fd limit)')
+    ap.add_argument('--per-host-inflight', type=int, default=None, help='Max concurrent probes per host')
+    ap.add_argument('--per-subnet-inflight', type=int, default=None, help='Max concurrent probes per /24')
+    ap.add_argument('--cache', nargs='?', const=scanCache.DEFAULT_PATH, default=None, metavar='PATH',
+                    help=f'Keep hostname/MAC/vendor/OS between runs in a scan cache file (default: {scanCache.DEFAULT_PATH})')
+    ap.add_argument('--cache-ttl', default=None,
+                    help='Per-field cache TTLs in seconds, e.g. hostname=3600,mac=600,vendor=604800,os=3600')
+    ap.add_argument('--diff-against', default=None, metavar='CSV',
+                    help='Previous --export-csv output: only deep-probe and report hosts that changed since then')
+    ap.add_argument('--rate', default=None,
+                    help='Max probes started per second for the whole scan, e.g. 500 or 500/s (default: unlimited)')
+    ap.add_argument('--subnet-rate', default=None, help='Max probes started per second per destination /24')
+    ap.add_argument('--burst', type=int, default=None, help='Probes allowed in a burst above --rate (default: rate/10)')
+    ap.add_argument('--timeout-floor', type=float, default=None,
+                    help='Shortest adaptive connect timeout in seconds (default: 0.1)')
+    ap.add_argument('--timeout-ceiling', type=float, default=None,
+                    help='Longest adaptive connect timeout in seconds (default: 3.0)')
+    ap.add_argument('--fixed-timeouts', action='store_true',
+                    help='Use a flat 0.6s connect timeout instead of one derived from measured RTTs')
+    ap.add_argument('--profile', default=None, metavar='JSON',
+                    help='Time every stage (ping, hostname, ports, render...) and write the stats to this file')
+    ap.add_argument('--ignore-types', help='Comma separated types to ignore: host,alive,filtered,dead', default=None)
     ap.add_argument('--export-csv', help='Export results to CSV file', default=None)
+    ap.add_argument('--export-ndjson', help='Export results to a newline-delimited JSON file', default=None)
+    ap.add_argument('--export-sqlite', default=None, metavar='DB',
+                    help='Append results to a SQLite scan history (query it with scanHistory.py)')
+    ap.add_argument('--gzip', action='store_true', help='Gzip the exports (also done for paths ending in .gz)')
+    ap.add_argument('--journal', default=None, metavar='PATH',
+                    help='Append every finished target to this journal so the scan can be resumed')
+    ap.add_argument('--resume', default=None, metavar='PATH',
+                    help='Skip targets already finished in this journal and keep journaling to it')
     ap.add_argument('--short-terminal', action='store_true', help='For short terminals, ')
+    ap.add_argument('--plain', action='store_true', help='No colors or progress bar, for piping output into files/grep')
     ap.add_argument('--skip-ports', action='store_true', help='Skip port scanning')
     ap.add_argument('--skip-vendor', action='store_true', help='Skips vendor from MAC address scraping')
 
     args = ap.parse_args()
 
+    if args.plain:
+        set_plain_mode()
+
+    if args.worker:
+        address = parse_address(args.worker)
+        if address is None:
+            print_error(f"Invalid --worker address: {args.worker}")
+            return
+        try:
+            run_worker(address, _shard_worker, args.token)
+        except KeyboardInterrupt:
+            print_warn("Interrupted, leaving the coordinator (it hands our unit to someone else).")
+        return
+
+    if args.profile:
+        PROFILER.enable()
+
     field_manager = FieldManager()
 
-    ip_list: List[str] = []
+    targets = TargetSet()
 
     if args.range:
-        if args.range == 127:
-            print_warn("No --range argument provided, scanning classic range(192.168.0.0/24)")
-            ip_list = expand_range("192.168.0.0/24")
-        elif args.range == '127.0.0.1':
+        if args.range == '127.0.0.1':
             print_cat(
                 f"Nothing feels like {CSI}1;31m1{CSI}1;32m2{CSI}1;33m7{CSI}1;37m.{CSI}1;34m0{CSI}1;37m.{CSI}1;35m0{CSI}1;37m.{CSI}1;36m1{RESET} doesn't it?")
-            ip_list = expand_range("127.0.0.1-127.0.0.1")
-        else:
-            ip_list = expand_range(args.range)
-    elif args.ips:
-        ip_list = parse_ip_list(args.ips)
-    elif args.file:
-        ip_list = load_ips_from_file(args.file)
-
-    ip_list = [ip for ip in ip_list if is_valid_ip(ip)]
-    if not ip_list:
+        targets.add_spec(args.range)
+    if args.ips:
+        for ip in parse_ip_list(args.ips):
+            if not targets.add_ip(ip):
+                print_warn(f"Skipping invalid IP: {ip}")
+    if args.file:
+        targets.update(load_targets_from_file(args.file))
+    if not (args.range or args.ips or args.file):
+        print_warn("No --range argument provided, scanning classic range(192.168.0.0/24)")
+        targets.add_spec("192.168.0.0/24")
+
+    if not targets:
         print_error("No valid IPs to scan.")
         return
 
-    ip_list = sorted(set(ip_list), key=ip_to_int)
+    # ip_list stays lazy, IPs are generated in order while the scan consumes them
+    ip_list = targets
 
     ports = None
     if args.port_range:
@@ -438,11 +733,13 @@ def main():
     if args.skip_ports:
         print_info(f"Port scanning {CSI}1mdisabled{RESET} (--skip-ports)", False)
         ports = None
+    elif args.first_hit:
+        print_info(f"Port scans stop at the first open port (--first-hit)", False)
 
     ignore_set = set()
     if args.ignore_types:
         requested = {x.strip().lower() for x in args.ignore_types.split(',') if x.strip()}
-        allowed = {'host', 'alive', 'dead'}
+        allowed = {'host', 'alive', 'filtered', 'dead'}
         invalid = requested - allowed
         if invalid:
             print_warn(f"Ignoring invalid types in --ignore-types: {', '.join(sorted(invalid))}")
@@ -454,88 +751,304 @@ def main():
         short_terminal=True
         pass_st_var()
 
-    total = len(ip_list)
-    ip_width = max(len(ip) for ip in ip_list)
+    RTT.configure(args.timeout_floor, args.timeout_ceiling, not args.fixed_timeouts)
+    set_filtered_policy(args.filtered_hosts)
+    PORT_STATS.configure(not args.fixed_port_order, args.first_hit)
+    if RTT.enabled:
+        print_info(f"Adaptive connect timeouts: {RTT.floor:g}s - {RTT.ceiling:g}s", False)
+
+    rate = parse_rate(args.rate) if args.rate else None
+    subnet_rate = parse_rate(args.subnet_rate) if args.subnet_rate else None
+    if args.rate and rate is None:
+        print_warn(f"Invalid --rate {args.rate}, not rate limiting.")
+    if args.subnet_rate and subnet_rate is None:
+        print_warn(f"Invalid --subnet-rate {args.subnet_rate}, ignoring it.")
+    _configure_limits(args, rate, subnet_rate)
+
+    limit = fd_limit()
+    print_info(f"Probe budget: {BUDGET.total} in-flight probes"
+               + (f" (fd limit {limit})" if limit else "")
+               + (f", {BUDGET.per_host}/host" if BUDGET.per_host else "")
+               + (f", {BUDGET.per_subnet}/24" if BUDGET.per_subnet else "")
+               + (" per process" if args.processes > 1 else ""), False)
+
+    if RATE.enabled:
+        print_info("Rate limit: "
+                   + ", ".join(([f"{rate:g} probes/s (burst {RATE.burst:g})"] if rate else [])
+                               + ([f"{subnet_rate:g}/s per /24"] if subnet_rate else [])), False)
+
+    if args.cache:
+        try:
+            scanCache.open_cache(args.cache, scanCache.parse_ttls(args.cache_ttl) if args.cache_ttl else None)
+            PORT_STATS.load(args.cache)
+            print_info(f"Using scan cache {args.cache}", False)
+        except sqlite3.Error as e:
+            print_warn(f"Scan cache disabled, could not open {args.cache}: {e}")
+
+    resumed = {}
+    if args.resume and os.path.exists(args.resume):
+        try:
+            header, done = load_journal(args.resume)
+        except OSError as e:
+            print_error(f"Could not read journal {args.resume}: {e}")
+            return
+        resumed = {ip: row for ip, row in done.items() if ip in targets}
+        if header.get('fields') and header['fields'] != field_manager.get_csv_fieldnames(args.skip_ports):
+            print_warn("Journal was written with different fields, resumed rows keep what they had.")
+        finished = TargetSet()
+        for ip in resumed:
+            finished.add_ip(ip)
+        ip_list = targets.difference(finished)
+        print_info(f"Resuming from {args.resume}: {len(resumed)}/{len(targets)} target(s) already done", False)
+    elif args.resume:
+        print_warn(f"No journal at {args.resume} yet, starting from scratch.")
+
+    journal = None
+    if args.resume or args.journal:
+        try:
+            journal = ScanJournal(args.resume or args.journal, {
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'fields': field_manager.get_csv_fieldnames(args.skip_ports),
+                'ports': ports,
+            })
+        except OSError as e:
+            print_error(f"Could not open journal: {e}")
+
+    total = len(targets)
+    ip_width = targets.max_ip_width()
+
+    processes = max(1, args.processes)
+    print_info(f"Starting scan of {total} IP(s) with up to {args.workers} workers ({args.engine} engine)"
+               + (f" in each of {processes} processes" if processes > 1 else "") + "...\n", True)
+
+    previous = None
+    if args.diff_against:
+        previous = load_snapshot(args.diff_against)
+        if previous is None:
+            return
+
+    # sinks are open before any probe goes out, so Ctrl-C during the sweep still closes them properly
+    sinks = []
+    fieldnames = field_manager.get_csv_fieldnames(args.skip_ports)
+    if previous is not None:
+        fieldnames = fieldnames + ['change']
+    for path, sink_type, kind in ((args.export_csv, CSVSink, 'CSV'), (args.export_ndjson, NDJSONSink, 'NDJSON')):
+        if not path:
+            continue
+        try:
+            sinks.append(sink_type(path, fieldnames, compress=args.gzip))
+            print_info(f"Streaming results to {path}", False)
+        except OSError as e:
+            print_error(f"Failed to export {kind}: {e}")
+    history = None
+    if args.export_sqlite:
+        try:
+            history = SQLiteSink(args.export_sqlite, fieldnames, ' '.join(sys.argv[1:]))
+            sinks.append(history)
+            print_info(f"Recording scan #{history.scan_id} in {args.export_sqlite}", False)
+        except sqlite3.Error as e:
+            print_error(f"Failed to open scan history {args.export_sqlite}: {e}")
 
-    print_info(f"Starting scan of {total} IP(s) with up to {args.workers} workers...\n", True)
+    def export(result_data):
+        for sink in sinks:
+            sink.write(result_data)
+
+    # WOL links are clickable as soon as lines show up, so the server starts before the scan
+    server = WOLButtonServer(port=2)
+    server_thread = threading.Thread(target=server.start, daemon=True)
+    server_thread.start()
 
     start_time = time.time()
-    separator_length = 0
-    csv_results = []
 
     dead = 0
     alive = 0
     host = 0
-
+    filtered = 0
+
+    discovery_workers = _discovery_workers(args)
+
+    diff_plan = None
+    scan_total = len(ip_list)
+    scan_results = None
+    scan_iter = None
+    renderer = None
+    reorder = ReorderBuffer() if args.sorted else None
+
+    def emit(status_key, line, plain_length, result_data):
+        if diff_plan is not None:
+            change = diff_plan.changes.get(result_data['ip'], result_data.get('change', ''))
+            result_data['change'] = change
+            line = f"[{change}] {line}" if change else line
+        if sinks:
+            with PROFILER.stage('export'):
+                export(result_data)
+        if status_key not in ignore_set:
+            renderer.row(line, plain_length)
+
+    scanned = 0
+    interrupted = False
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as ex:
-            futures = [
-                ex.submit(scan_ip_return, ip, field_manager, ports, ip_width, args.skip_ports)
-                for ip in ip_list
-            ]
-
-            result = []
-            print_loading_bar(0, total, "")
-
-            for idx, fut in enumerate(futures, start=1):
-                try:
-                    status_key, line, plain_length, result_data = fut.result()
-                    separator_length = plain_length
-                    csv_results.append(result_data)
-
-                    if result_data["status"] == 'dead':
-                        dead += 1
-                    elif result_data["status"] == 'alive':
-                        alive += 1
-                    elif result_data["status"] == 'host':
-                        host += 1
-
-                except Exception as e:
-                    error_data = {
-                        'ip': ip_list[idx - 1],
-                        'status': 'error'
-                    }
-                    active_fields = field_manager.get_active_fields(args.skip_ports)
-                    for field in active_fields:
-                        error_data[field.key] = '[err]'
-
-                    line, plain_length = _build_output_line(
-                        ip_list[idx - 1], ip_width, status_dead(),
-                        error_data, active_fields, field_manager
-                    )
-                    line += f" ({e})"
-                    separator_length = plain_length
-                    csv_results.append(error_data)
-                    status_key = "dead"
-
-                if status_key not in ignore_set:
-                    result.append(f"{'-' * separator_length}\n{line}")
-
-                print_loading_bar(idx, total, f"({idx}/{total} scanned)")
+        # finished in an earlier run: counted and exported again, not printed
+        for row in resumed.values():
+            if row.get('status') == 'dead':
+                dead += 1
+            elif row.get('status') == 'alive':
+                alive += 1
+            elif row.get('status') == 'host':
+                host += 1
+            elif row.get('status') == 'filtered':
+                filtered += 1
+            export(row)
+
+        # with --processes/--coordinator every worker sweeps its own shard
+        if set_ping_method(args.ping_method) == 'icmp' and processes == 1 and not args.coordinator:
+            answered = sweep_hosts(ip_list)
+            if answered is not None:
+                print_info(f"ICMP sweep: {answered}/{len(ip_list)} host(s) answered "
+                           f"in {time.time() - start_time:.2f}s", False)
+
+        # probes above just (re)populated the kernel neighbor table, snapshot it once for MAC lookups
+        NEIGHBORS.refresh(force=True)
+
+        if previous is not None:
+            diff_plan = plan_diff(ip_list, previous, discovery_workers, discovery_workers * 2)
+            counts = diff_plan.counts()
+            print_info(f"Liveness pass done in {time.time() - start_time:.2f}s: "
+                       f"{counts['new']} new, {counts['back']} back, {counts['changed']} changed, "
+                       f"{counts['gone']} gone, {counts['unchanged']} unchanged", False)
+            ip_list = diff_plan.enrich
+            scan_total = len(ip_list)
+        def render(ip: str, result_data: dict):
+            return _worker_result(ip, result_data, field_manager, ip_width, args.skip_ports)
+
+        if args.coordinator:
+            address = parse_address(args.coordinator)
+            if address is None:
+                print_error(f"Invalid --coordinator address: {args.coordinator}")
+                return
+            # workers get the whole scan configuration, minus what only makes sense here
+            worker_args = dict(vars(args), profile=None, export_csv=None, export_ndjson=None, export_sqlite=None,
+                               diff_against=None, journal=None, resume=None, coordinator=None, local_workers=0,
+                               worker=None, token=None)
+            config = {'args': worker_args, 'ports': ports, 'ip_width': ip_width, 'rate': rate,
+                      'subnet_rate': subnet_rate, 'shares': 1, 'subnet_shares': 1}
+            scan_results = Coordinator(ip_list, address, config, render, args.token, args.local_workers)
+            if not is_loopback(address[0]) and not scan_results.token:
+                print_error(f"Refusing to listen on {address[0]} without --token (or PYIPSCANNER_TOKEN), "
+                            f"anyone could join as a worker.")
+                return
+            try:
+                scan_results.start()
+            except OSError as e:
+                print_error(f"Could not listen on {args.coordinator}: {e}")
+                return
+            print_info(f"Coordinator on {scan_results.address[0]}:{scan_results.address[1]}, "
+                       f"{len(scan_results.units)} work unit(s)"
+                       + (f", starting {args.local_workers} local worker(s)" if args.local_workers else ""), False)
+        elif processes > 1:
+            config = {'args': args, 'ports': ports, 'ip_width': ip_width, 'rate': rate, 'subnet_rate': subnet_rate}
+            scan_results = ShardedScan(ip_list, processes, _shard_worker, config, render,
+                                       args.shard_mode == 'interleave')
+            config.update(shares=len(scan_results.shards), subnet_shares=scan_results.subnet_shares)
+        else:
+            scan_results = _start_engine(ip_list, field_manager, ports, ip_width, args)
+
+        print("\n")
+        renderer = Renderer(scan_total, short_terminal=short_terminal)
+
+        if diff_plan is not None:
+            for ip in diff_plan.gone:
+                emit(*_gone_result(ip, previous[ip], field_manager, ip_width, args.skip_ports))
+            # unchanged and still-dead hosts aren't reported, but they stay in the export so it can be
+            # diffed against next time (a dead row there is what makes a later return "back", not "new")
+            if sinks:
+                for ip in diff_plan.unchanged:
+                    export(dict(previous[ip], change=''))
+                dead_row = {field.key: field.default_value for field in field_manager.get_active_fields(args.skip_ports)}
+                for ip in diff_plan.dead:
+                    export(dict(previous.get(ip, dead_row), ip=ip, status='dead', change=''))
+
+        renderer.progress(0)
+
+        scan_iter = iter(scan_results)
+        for idx, ip, outcome in scan_iter:
+            if isinstance(outcome, Exception):
+                outcome = _error_result(ip, outcome, field_manager, ip_width, args.skip_ports)
+
+            result_data = outcome[3]
+            # errors aren't journaled, a resumed scan tries those hosts again
+            if journal is not None and result_data['status'] != 'error':
+                journal.record(result_data)
+            if result_data["status"] == 'dead':
+                dead += 1
+            elif result_data["status"] == 'alive':
+                alive += 1
+            elif result_data["status"] == 'host':
+                host += 1
+            elif result_data["status"] == 'filtered':
+                filtered += 1
+
+            for ready in (reorder.push(idx, outcome) if reorder is not None else [outcome]):
+                emit(*ready)
+
+            scanned += 1
+            renderer.progress(scanned, f"({scanned}/{scan_total} scanned)")
 
     except KeyboardInterrupt:
-        print_warn("Interrupted by user, shutting down workers.")
-
-    server = WOLButtonServer(port=2)
-    server_thread = threading.Thread(target=server.start, daemon=True)
-    server_thread.start()
-
-    #results
-    print("\n\n")
-    if short_terminal:
-        for thing in result:
-            splitted = thing.split(" | ")
-            print(splitted[0].replace("-", ""))
-            for a in splitted:
-                if len(a) < 150:
-                    print(a)
-            print("\n\n")
-    else:
-        for thing in result:
-            print(thing)
+        interrupted = True
+        # queued hosts get dropped and running ones fail their next probe instead of finishing
+        BUDGET.cancel()
+        RATE.cancel()
+        if renderer is not None:
+            renderer.flush()
+        print_warn("Interrupted by user, cancelling pending work.")
+    finally:
+        if scan_iter is not None:
+            scan_iter.close()
+        if journal is not None:
+            journal.close()
+        if reorder is not None:
+            for ready in reorder.flush():
+                emit(*ready)
+        if renderer is not None:
+            renderer.close()
+        if history is not None:
+            history.interrupted = interrupted
+        for sink in sinks:
+            sink.close()
+        cache = scanCache.CACHE
+        scanCache.close_cache()
+        PORT_STATS.save()
+        if isinstance(scan_results, Coordinator):
+            scan_results.close()
+
+    if isinstance(scan_results, (ShardedScan, Coordinator)):
+        for stats in scan_results.stats:
+            # rate stamps are only comparable between processes on the same machine
+            if isinstance(scan_results, ShardedScan):
+                RATE.merge(stats['rate'])
+            if cache is not None and stats['cache']:
+                cache.hits += stats['cache'][0]
+                cache.misses += stats['cache'][1]
+            if stats['profile']:
+                PROFILER.merge(stats['profile'])
+        for error in scan_results.errors:
+            print_warn(f"Scan worker failed: {error}")
+
+    if diff_plan is not None:
+        # carried-over hosts count as whatever they were last time
+        for ip in diff_plan.unchanged:
+            if previous[ip].get('status') == 'host':
+                host += 1
+            elif previous[ip].get('status') == 'filtered':
+                filtered += 1
+            else:
+                alive += 1
+        dead = total - host - alive - filtered
 
-    if separator_length > 0 and not short_terminal:
-        print(f"{'-' * separator_length}")
+    print("\n")
+    if renderer is not None and renderer.separator_length > 0 and not short_terminal:
+        print(f"{'-' * renderer.separator_length}")
 
     #summary
     end_time = time.time()
@@ -548,18 +1061,45 @@ def main():
     print_success(f"{CSI}31mDead IP(s):{CSI}1;91m {dead} ({dead}/{total}){RESET}")
     print_success(f"{CSI}34mAlive IP(s):{CSI}1;94m {alive} ({alive}/{total}){RESET}")
     print_success(f"{CSI}32mIP(s) with open port(s):{CSI}1;92m {host} ({host}/{total}){RESET}")
+    if filtered:
+        print_success(f"{CSI}33mFiltered IP(s) (no port answered):{CSI}1;93m {filtered} ({filtered}/{total}){RESET}")
     print("\n")
-    print_success(f"{CSI}33mTotal:{CSI}1;93m {host + alive} ({host + alive}/{total}){RESET}")
+    print_success(f"{CSI}33mTotal:{CSI}1;93m {host + alive + filtered} ({host + alive + filtered}/{total}){RESET}")
+    if diff_plan is not None:
+        counts = diff_plan.counts()
+        print_success(f"Changes since {args.diff_against}: {counts['new']} new, {counts['back']} back, "
+                      f"{counts['changed']} changed, {counts['gone']} gone ({counts['unchanged']} unchanged)")
+
+    if RATE.enabled:
+        achieved = RATE.achieved()
+        target = f"{RATE.rate:g}/s" if RATE.rate else f"{RATE.per_subnet:g}/s per /24"
+        print_info(f"Probe rate: {RATE.sent} probes, achieved {achieved:.1f}/s (target {target})"
+                   if achieved else f"Probe rate: {RATE.sent} probes (target {target})", False)
+
+    if isinstance(scan_results, Coordinator) and scan_results.workers:
+        print_info(f"Worker nodes: {', '.join(scan_results.workers)}", False)
+
+    if cache is not None and cache.hits:
+        print_info(f"Scan cache: {cache.hits} field(s) reused, {cache.misses} fetched", False)
+
+    if args.profile:
+        print("\n")
+        for row in PROFILER.summary_lines():
+            print(row)
+        try:
+            PROFILER.write(args.profile)
+            print_success(f"Stage timings written to {args.profile}")
+        except OSError as e:
+            print_error(f"Failed to write profile: {e}")
 
-    if args.export_csv:
-        print_info(f"Exporting results to {args.export_csv}...", False)
-        if export_to_csv(csv_results, args.export_csv, field_manager, args.skip_ports):
-            print_success(f"Successfully exported {len(csv_results)} results to {args.export_csv}")
-        else:
-            print_error(f"Failed to export results to CSV")
+    for sink in sinks:
+        print_success(f"Successfully exported {sink.count} results to {sink.path}")
+    if journal is not None and interrupted:
+        print_info(f"{len(resumed) + journal.count} finished target(s) are in {journal.path}, "
+                   f"continue with --resume {journal.path}", False)
 
 def scan():
-    print(NAME)
+    print(strip_ansi(NAME) if '--plain' in sys.argv[1:] else NAME)
     main()
     try:
         input()
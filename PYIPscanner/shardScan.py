@@ -0,0 +1,159 @@
+from typing import Any, Callable, Iterator, List, Tuple
+from multiprocessing.connection import wait
+from netHelpers import TargetSet
+import multiprocessing
+import threading
+import time
+
+# --processes: one scan engine per worker process, each on its own shard of the targets,
+# so probing and parsing stop sharing one GIL. Shards are built from
+# /24-aligned blocks (smaller ones when the scan is too small to give every worker a /24),
+# dealt round-robin (interleave: dense subnets get spread over all workers) or handed out
+# as contiguous runs (blocks). Workers send finished rows back in small batches over a
+# pipe as plain result data, the parent merges, renders, counts and exports.
+#
+# Workers are spawned, not forked: the parent already runs threads (WOL server, resolver)
+# and holds an sqlite connection, neither of which survives a fork cleanly.
+
+BLOCK = 256
+BATCH_SIZE = 64
+BATCH_INTERVAL = 0.05   # seconds, so slow hosts at the tail don't sit in a half-full batch
+
+
+def split_blocks(targets: TargetSet, block: int = BLOCK) -> Iterator[Tuple[int, int]]:
+    # (start, end) pieces of `targets` that never cross a multiple of `block`
+    for start, end in targets.intervals:
+        n = start
+        while n <= end:
+            stop = min(end, (n // block + 1) * block - 1)
+            yield n, stop
+            n = stop + 1
+
+
+def shard_targets(targets: TargetSet, shards: int, interleave: bool = True) -> Tuple[List[TargetSet], int]:
+    """Splits `targets` into at most `shards` non-empty sets. Returns (shards, block size)."""
+    total = len(targets)
+    block = BLOCK if total >= BLOCK * shards else max(1, -(-total // shards))
+    per_shard = -(-total // shards)
+    out = [TargetSet() for _ in range(shards)]
+    placed = 0
+    for dealt, (start, stop) in enumerate(split_blocks(targets, block)):
+        shard = dealt % shards if interleave else min(shards - 1, placed // per_shard)
+        out[shard].add_interval(start, stop)
+        placed += stop - start + 1
+    return [s for s in out if s], block
+
+
+class BatchSender:
+    """Collects (ip, outcome) rows and hands them to `post('rows', rows)` in batches."""
+
+    def __init__(self, post: Callable[[str, Any], None]):
+        self.post = post
+        self._rows: List[Tuple[str, Any]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def send(self, ip: str, outcome: Any):
+        with self._lock:
+            self._rows.append((ip, outcome))
+            if len(self._rows) >= BATCH_SIZE:
+                self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self.post('rows', self._rows)
+            self._rows = []
+
+    def _flush_loop(self):
+        while not self._stop.wait(BATCH_INTERVAL):
+            with self._lock:
+                self._flush()
+
+    def close(self, kind: str, payload: Any):
+        self._stop.set()
+        with self._lock:
+            self._flush()
+            self.post(kind, payload)
+
+
+def _worker_main(target: Callable, shard: TargetSet, config: Any, conn):
+    sender = BatchSender(lambda kind, payload: conn.send((kind, payload)))
+    try:
+        stats = target(shard, config, sender.send)
+        sender.close('done', stats)
+    except KeyboardInterrupt:
+        pass   # the parent got the Ctrl-C too and stops reading
+    except Exception as e:
+        sender.close('error', f"{type(e).__name__}: {e}")
+    finally:
+        conn.close()
+
+
+class ShardedScan:
+    """Runs `target(shard, config, send)` in one process per shard and yields (idx, ip, outcome)
+    like the in-process engines, idx being the IP's position in `targets`. Workers send
+    (ip, result_data), `render(ip, result_data)` turns that into the outcome here."""
+
+    def __init__(self, targets: TargetSet, processes: int, target: Callable, config: Any,
+                 render: Callable[[str, dict], tuple], interleave: bool = True):
+        self.targets = targets
+        self.target = target
+        self.render = render
+        self.config = config
+        self.shards, self.block = shard_targets(targets, processes, interleave)
+        self.stats: List[Any] = []    # whatever each worker's target returned
+        self.errors: List[str] = []   # workers that died or raised
+
+    @property
+    def subnet_shares(self) -> int:
+        # with sub-/24 blocks one /24 is spread over several workers, per-/24 limits get split between them
+        return 1 if self.block >= BLOCK else len(self.shards)
+
+    def __iter__(self) -> Iterator[Tuple[int, str, Any]]:
+        ctx = multiprocessing.get_context('spawn')
+        procs = []
+        readers = []
+        try:
+            for shard in self.shards:
+                reader, writer = ctx.Pipe(duplex=False)
+                proc = ctx.Process(target=_worker_main, args=(self.target, shard, self.config, writer), daemon=True)
+                proc.start()
+                writer.close()
+                procs.append(proc)
+                readers.append(reader)
+
+            while readers:
+                for reader in wait(readers):
+                    try:
+                        kind, payload = reader.recv()
+                    except EOFError:
+                        self.errors.append("worker exited without finishing its shard")
+                        kind = None
+                    if kind == 'rows':
+                        for ip, result_data in payload:
+                            yield self.targets.index(ip), ip, self.render(ip, result_data)
+                        continue
+                    if kind == 'done':
+                        self.stats.append(payload)
+                    elif kind == 'error':
+                        self.errors.append(payload)
+                    readers.remove(reader)
+                    reader.close()
+        finally:
+            for proc in procs:
+                if proc.is_alive():
+                    proc.terminate()
+            for proc in procs:
+                proc.join(1)
+            for reader in readers:
+                reader.close()
+
+
+if __name__ == "__main__": # Testing
+    targets = TargetSet()
+    targets.add_spec("10.0.0.0/22")
+    targets.add_spec("10.0.8.0-10.0.8.99")
+    for interleave in (True, False):
+        shards, block = shard_targets(targets, 3, interleave)
+        print("interleave" if interleave else "blocks", block, [(len(s), s.intervals) for s in shards])
@@ -0,0 +1,190 @@
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+import functools
+import threading
+import json
+import math
+import time
+
+# --profile: where does a scan's time go. Each stage (ping, hostname, open_ports, render...)
+# gets a count, total time and a log-bucketed latency histogram for p50/p95/p99, plus how
+# long work sat in a queue before a worker picked it up. Off by default, and then every
+# hook is a no-op.
+
+BUCKETS_PER_DECADE = 20
+MIN_SECONDS = 1e-6
+MAX_BUCKET = BUCKETS_PER_DECADE * 9   # up to 1000s
+
+_NULL = nullcontext()
+
+
+def _bucket(seconds: float) -> int:
+    if seconds <= MIN_SECONDS:
+        return 0
+    return min(MAX_BUCKET, int(math.log10(seconds / MIN_SECONDS) * BUCKETS_PER_DECADE) + 1)
+
+
+def _bucket_upper(index: int) -> float:
+    return MIN_SECONDS * 10 ** (index / BUCKETS_PER_DECADE)
+
+
+class Histogram:
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets: Dict[int, int] = {}
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        index = _bucket(seconds)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other: 'Histogram'):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self.max, _bucket_upper(index))
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'total_s': round(self.total, 6),
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(50) * 1000, 3),
+            'p95_ms': round(self.percentile(95) * 1000, 3),
+            'p99_ms': round(self.percentile(99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+        }
+
+
+class _TimedExecutor:
+    """Executor wrapper that records how long each task waited before a worker started it."""
+
+    def __init__(self, executor, profiler: 'Profiler', stage: str):
+        self._executor = executor
+        self._profiler = profiler
+        self._stage = stage
+
+    def _run(self, submitted: float, fn, *args):
+        self._profiler.record_wait(self._stage, time.perf_counter() - submitted)
+        with self._profiler.stage(self._stage):
+            return fn(*args)
+
+    def submit(self, fn, *args):
+        return self._executor.submit(self._run, time.perf_counter(), fn, *args)
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Histogram] = {}
+        self._waits: Dict[str, Histogram] = {}
+        self._started = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+        self._started = time.perf_counter()
+
+    def record(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self._stages.get(name)
+            if hist is None:
+                hist = self._stages[name] = Histogram()
+            hist.add(seconds)
+
+    def record_wait(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self._waits.get(name)
+            if hist is None:
+                hist = self._waits[name] = Histogram()
+            hist.add(seconds)
+
+    @contextmanager
+    def _timed(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def stage(self, name: str):
+        return self._timed(name) if self.enabled else _NULL
+
+    def timed(self, name: str):
+        """Decorator version of stage(), checks `enabled` per call so it can wrap module-level functions."""
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return inner
+        return wrap
+
+    def wrap_executor(self, executor, stage: str):
+        return _TimedExecutor(executor, self, stage) if self.enabled else executor
+
+    def snapshot(self) -> tuple:
+        # raw histograms, for shipping a worker process' timings to the parent
+        with self._lock:
+            return dict(self._stages), dict(self._waits)
+
+    def merge(self, snapshot: tuple):
+        with self._lock:
+            for mine, theirs in zip((self._stages, self._waits), snapshot):
+                for name, hist in theirs.items():
+                    mine.setdefault(name, Histogram()).merge(hist)
+
+    def report(self) -> dict:
+        with self._lock:
+            stages = {name: hist.to_dict() for name, hist in self._stages.items()}
+            waits = {name: hist.to_dict() for name, hist in self._waits.items()}
+        for name, wait in waits.items():
+            stages.setdefault(name, Histogram().to_dict())['queue_wait'] = wait
+        return {'wall_s': round(time.perf_counter() - self._started, 6), 'stages': stages}
+
+    def write(self, path: str) -> dict:
+        report = self.report()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def summary_lines(self) -> List[str]:
+        stages = self.report()['stages']
+        header = f"{'stage':<14}{'count':>9}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'wait p95':>10}"
+        lines = [header, '-' * len(header)]
+        for name, s in sorted(stages.items(), key=lambda item: -item[1]['total_s']):
+            wait = s.get('queue_wait', {}).get('p95_ms')
+            lines.append(f"{name:<14}{s['count']:>9}{s['total_s']:>10.2f}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}"
+                         f"{s['p99_ms']:>10.2f}{'' if wait is None else f'{wait:.2f}':>10}")
+        return lines
+
+
+PROFILER = Profiler()
@@ -0,0 +1,45 @@
+import json
+import csv
+import sys
+
+import netTools
+import scanner
+from scanJournal import ScanJournal, load_journal
+
+# Ctrl-C during the ICMP presweep, before any host went through the engine: main() has to
+# cancel cleanly and leave a complete export and a resumable journal behind.
+
+FIELDS = ['ip', 'status', 'hostname', 'open_ports', 'ping_ms', 'mac', 'vendor', 'os', 'wol']
+
+
+def _interrupt(batch, timeout_sec=1):
+    raise KeyboardInterrupt
+
+
+def test_ctrl_c_during_presweep_flushes_export_and_journal(tmp_path, monkeypatch):
+    journal_path = tmp_path / "scan.journal"
+    csv_path = tmp_path / "scan.csv"
+
+    # two targets finished in an earlier run, the other two are still to do
+    journal = ScanJournal(str(journal_path), {'fields': FIELDS, 'ports': None})
+    for ip in ('127.0.0.0', '127.0.0.1'):
+        journal.record(dict({key: '[N/D]' for key in FIELDS}, ip=ip, status='alive'))
+    journal.close()
+
+    monkeypatch.setattr(scanner, 'set_ping_method', lambda method: 'icmp')
+    monkeypatch.setattr(netTools, 'uses_icmp_sweeper', lambda: True)
+    monkeypatch.setattr(netTools, 'sweep_batch', _interrupt)
+    monkeypatch.setattr(sys, 'argv', ['scanner.py', '--range', '127.0.0.0/30', '--plain',
+                                      '--resume', str(journal_path), '--export-csv', str(csv_path)])
+
+    scanner.main()   # the interrupt must not escape as a traceback
+
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert sorted(row['ip'] for row in rows) == ['127.0.0.0', '127.0.0.1']
+
+    header, done = load_journal(str(journal_path))
+    assert header['fields'] == FIELDS
+    assert sorted(done) == ['127.0.0.0', '127.0.0.1']
+    with open(journal_path, encoding='utf-8') as f:
+        assert all(json.loads(line) for line in f)